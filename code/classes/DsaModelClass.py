@@ -31,7 +31,7 @@ import numpy as np
 import warnings
 warnings.filterwarnings("ignore", category=RuntimeWarning)
 
-from classes.exceptions import MissingData
+from classes.exceptions import MissingData, NoSolution
 
 
 class DsaModel:
@@ -1054,7 +1054,115 @@ class DsaModel:
             + self.D_share_usd * self.d[t - 1] * (1 + self.iir[t] / 100) / (1 + self.ng[t] / 100) * (self.exr_usd[t] / self.exr_usd[t - 1])
             - self.pb[t] + self.sf[t], 0
         ])
+
+    # ========================================================================================= #
+    #                                   PROJECTION STATE                                        #
+    # ========================================================================================= #
+
+    # Attributes written by project() after adjustment steps are set
+    _projection_outputs = [
+        'i_st', 'i_lt', 'rgdp', 'rg', 'rg_pot', 'rgdp_pot', 'D_new_lt', 'iir', 'iir_lt',
+        'spb_steps', 'spb_steps_baseline', 'diff_adjustment_baseline', 'offset_deficit_resilience',
+        'spb_bca', 'spb_bca_adjustment', 'fiscal_multiplier_effect', 'output_gap', 'ng', 'ngdp',
+        'sf', 'SF', 'ageing_component', 'revenue_component', 'spb', 'SPB', 'net_expenditure_growth',
+        'cyclical_component', 'pb', 'PB', 'alpha', 'beta', 'interest_st', 'interest_lt', 'interest',
+        'interest_ratio', 'repayment_st', 'repayment_lt', 'repayment', 'GFN', 'D', 'D_st', 'D_lt',
+        'OB', 'SB', 'ob', 'sb', 'd', 'lower_spb_shock', 'adverse_r_g_shock', 'financial_stress_shock'
+    ]
+
+    # Attributes set by project() before adjustment steps are applied
+    _projection_inputs = [
+        'spb_target', 'policy_change', 'scenario', 'edp_steps', 'deficit_resilience_steps', 'post_spb_steps'
+    ]
+
+    def _projection_state(self, variables=None):
+        """
+        Return copy of projected state arrays.
+        """
+        variables = self._projection_outputs if variables is None else variables
+        return {
+            var: np.copy(getattr(self, var)) if isinstance(getattr(self, var), np.ndarray) else getattr(self, var)
+            for var in variables if hasattr(self, var)
+        }
+
+    def _set_projection_state(self, state):
+        """
+        Set projected state arrays, copy into existing arrays to keep aliasing identical to a regular projection.
+        """
+        for var, value in state.items():
+            current = getattr(self, var, None)
+            if (isinstance(value, np.ndarray)
+                and isinstance(current, np.ndarray)
+                and current.shape == value.shape):
+                current[...] = value
+            else:
+                setattr(self, var, np.copy(value) if isinstance(value, np.ndarray) else value)
+
+    # ========================================================================================= #
+    #                               ANALYTIC SPB BRACKET                                        #
+    # ========================================================================================= #
+
+    def debt_stabilizing_pb(self, baseline=None):
+        """
+        Calculate the primary balance that keeps the debt ratio constant in each year under the no-policy-change 
+        projection, i.e. the debt ratio recursion of _calc_debt_ratio solved for d[t] = d[t-1]. Model state is unchanged.
+        A no-policy-change projection from _no_policy_change_projection can be passed as baseline to avoid projecting again.
+        """
+        if baseline is None:
+            baseline = self._no_policy_change_projection()
+        d_prev = baseline['d'][:-1]
+        interest_growth_factor = (1 + baseline['iir'][1:] / 100) / (1 + baseline['ng'][1:] / 100)
+        exchange_rate_factor = (self.D_share_domestic
+                                + self.D_share_eur * self.exr_eur[1:] / self.exr_eur[:-1]
+                                + self.D_share_usd * self.exr_usd[1:] / self.exr_usd[:-1])
         
+        pb_stabilizing = np.full(self.projection_period, np.nan, dtype=np.float64)
+        pb_stabilizing[1:] = d_prev * interest_growth_factor * exchange_rate_factor - d_prev + baseline['sf'][1:]
+        return pb_stabilizing
+
+    def spb_target_bracket(self, criterion=None, bounds=(-10, 10), margin=1):
+        """
+        Return bracket for the SPB target of a criterion based on the gap between the debt-stabilizing and the 
+        no-policy-change primary balance over the criterion horizon. For the deficit criterion, the gap to a 
+        primary balance that keeps the deficit at 3% is used. The bracket is widened by margin and clipped to bounds.
+        """
+        baseline = self._no_policy_change_projection()
+
+        # Criterion horizon, stochastic criteria apply to the stochastic period
+        if criterion == 'stochastic':
+            horizon = slice(self.stochastic_start, self.stochastic_end + 1)
+        else:
+            horizon = slice(self.adjustment_end + 1, self.adjustment_end + 11)
+
+        # Gap between required primary balance and no-policy-change primary balance
+        if criterion == 'deficit_reduction':
+            pb_required = baseline['interest_ratio'] - 3
+        else:
+            pb_required = self.debt_stabilizing_pb(baseline=baseline)
+        pb_gap = pb_required[horizon] - baseline['pb'][horizon]
+
+        # Add gap to SPB at adjustment start
+        spb_start = self.spb_bca[self.adjustment_start - 1]
+        lower = np.clip(spb_start + np.nanmin(pb_gap) - margin, bounds[0], bounds[1])
+        upper = np.clip(spb_start + np.nanmax(pb_gap) + margin, bounds[0], bounds[1])
+        return lower, upper
+
+    def _no_policy_change_projection(self):
+        """
+        Return no-policy-change projection of variables needed for the analytic bracket, restores model state.
+        """
+        variables = self._projection_outputs + self._projection_inputs
+        state = self._projection_state(variables)
+        self.project()
+        baseline = {var: np.copy(getattr(self, var)) for var in ['d', 'iir', 'ng', 'sf', 'pb', 'interest_ratio']}
+
+        # Restore state and remove attributes that did not exist before
+        self._set_projection_state(state)
+        for var in variables:
+            if var not in state and hasattr(self, var):
+                delattr(self, var)
+        return baseline
+
     # ========================================================================================= #
     #                               OPTIMIZATION METHODS                                        #
     # ========================================================================================= #
@@ -1181,9 +1289,10 @@ class DsaModel:
                 self.spb_target += 0.001
                 self.project(spb_target=self.spb_target, edp_steps=self.edp_steps)
 
-    def find_spb_deterministic(self, criterion, bounds=(-10, 10), steps=[0.01, 0.0001]):
+    def find_spb_deterministic(self, criterion, bounds=None, steps=[0.01, 0.0001]):
         """
-        Find the primary balance that ensures complience with deterministic criteria
+        Find the primary balance that ensures complience with deterministic criteria.
+        If no bounds are given, the search starts from the analytic bracket within (-10, 10).
         """
         # Check if input parameter correctly specified
         assert criterion in [
@@ -1197,10 +1306,7 @@ class DsaModel:
         ], 'Unknown deterministic criterion'
 
         # Set scenario parameter
-        if criterion in [None, 'main_adjustment', 'debt_safeguard']:
-            self.scenario = 'main_adjustment'
-        else:
-            self.scenario = criterion
+        self._set_deterministic_scenario(criterion)
 
         # Precalculate EDP for debt safeguard if not specified and call optimizer
         if not hasattr(self, 'edp_steps'):
@@ -1213,6 +1319,30 @@ class DsaModel:
         # Run deterministic optimization
         return self._deterministic_optimization(criterion=criterion, bounds=bounds, steps=steps)
 
+    def _set_deterministic_scenario(self, criterion):
+        """
+        Set scenario parameter for deterministic criterion
+        """
+        if criterion in [None, 'main_adjustment', 'debt_safeguard']:
+            self.scenario = 'main_adjustment'
+        else:
+            self.scenario = criterion
+
+    def _deterministic_condition_at(self, criterion, spb_target):
+        """
+        Checks if deterministic criterion is met at given SPB target with a single projection.
+        """
+        self._set_deterministic_scenario(criterion)
+        if not hasattr(self, 'edp_steps'):
+            self.edp_steps = None
+        self._get_spb_steps(criterion=criterion, spb_target=spb_target)
+        self.project(
+            edp_steps=self.edp_steps,
+            spb_steps=self.spb_steps,
+            scenario=self.scenario
+        )
+        return self._deterministic_condition(criterion=criterion)
+
     def _deterministic_optimization(self, criterion, bounds, steps):
         """
         Main loop of optimizer 
@@ -1227,6 +1357,16 @@ class DsaModel:
             )
             return self.spb_target
 
+        # Seed lower bound with analytic bracket if no bounds given
+        if bounds is None:
+            bounds = self._deterministic_bounds(criterion=criterion, steps=steps)
+
+        # Check feasibility at upper bound before scanning the whole range, scan if projection breaks down there
+        if not self._deterministic_condition_at(criterion=criterion, spb_target=bounds[1]):
+            upper_values = self._deterministic_criterion_values(criterion=criterion)
+            if np.all(np.isfinite(list(upper_values.values()))):
+                raise self._no_solution(criterion=criterion, bounds=bounds)
+
         # Initialize spb_target to the lower bound
         spb_target = bounds[0]
 
@@ -1264,7 +1404,7 @@ class DsaModel:
 
         # If spb_target exceeds upper bound, raise exception
         if spb_target > bounds[1] - steps[1]:
-            raise  # Exception(f'No solution found for {criterion}')
+            raise self._no_solution(criterion=criterion, bounds=bounds)
 
         # Return last valid spb_target as optimal spb and project with target
         self.spb_target = current_spb_target
@@ -1273,6 +1413,29 @@ class DsaModel:
 
         return self.spb_bca[self.adjustment_end]
 
+    def _deterministic_bounds(self, criterion, steps, bounds=(-10, 10)):
+        """
+        Return bounds with lower bound from analytic bracket, aligned to the grid of the default bounds.
+        Lower bound is decreased until criterion is violated, so the scan still finds the first valid target.
+        """
+        lower, _ = self.spb_target_bracket(criterion=criterion, bounds=bounds)
+        lower = bounds[0] + np.floor((lower - bounds[0]) / steps[0]) * steps[0]
+        while lower > bounds[0] and self._deterministic_condition_at(criterion=criterion, spb_target=lower):
+            lower = max(bounds[0], lower - 100 * steps[0])
+        return lower, bounds[1]
+
+    def _no_solution(self, criterion, bounds):
+        """
+        Return NoSolution exception with criterion values at both bounds.
+        """
+        bound_values = {}
+        for spb_target in bounds:
+            self._deterministic_condition_at(criterion=criterion, spb_target=spb_target)
+            bound_values[float(spb_target)] = self._deterministic_criterion_values(criterion=criterion)
+        return NoSolution(
+            criterion=criterion, country=self.country, bounds=tuple(float(b) for b in bounds), bound_values=bound_values
+            )
+
     def _get_spb_steps(self, criterion, spb_target):
         """
         Get adjustment steps 
@@ -1315,6 +1478,22 @@ class DsaModel:
         else:
             return False
 
+    def _deterministic_criterion_values(self, criterion):
+        """
+        Returns the values behind a deterministic criterion at the current projection.
+        """
+        if criterion in [None, 'main_adjustment', 'lower_spb', 'financial_stress', 'adverse_r_g']:
+            return {
+                'max_debt_change': float(np.max(np.diff(self.d[self.adjustment_end:self.adjustment_end + 11]))),
+                'debt_end': float(self.d[self.adjustment_end + 10]),
+            }
+        elif criterion == 'deficit_reduction':
+            return {'min_ob': float(np.min(self.ob[self.adjustment_end:self.adjustment_end + 11]))}
+        elif criterion == 'debt_safeguard':
+            return {'debt_adjustment_end': float(self.d[self.adjustment_end])}
+        else:
+            return {}
+
     def _debt_decline_criterion(self):
         """
         Checks the debt decline criterion from adjustment end to 10 years after adjustment end.
@@ -48,12 +48,39 @@ class GroupDsaModel:
         A local import is used here to avoid circular import issues.
         """
         from classes import StochasticDsaModel as DSA
+
+        # Root of the per-country random streams, kept fixed so every run spawns the same streams
+        seed = self.dsa_params.get('seed')
+        self._root_seed = None if seed is None else DSA._make_seed_sequence(seed)
+        country_seeds = self._country_seeds()
+
         for country in self.countries:
                 # Create a copy of the DSA parameters and update with country
                 model_params = self.dsa_params.copy()
                 model_params['country'] = country
+                if seed is not None:
+                    model_params['seed'] = country_seeds[country]
                 self.models[country] = DSA(**model_params)
 
+    def _country_seeds(self):
+        """
+        Spawn an independent random stream for each country from a fresh copy of the group root seed.
+        """
+        root_seed = np.random.SeedSequence(self._root_seed.entropy, spawn_key=self._root_seed.spawn_key)
+        return dict(zip(self.countries, root_seed.spawn(len(self.countries))))
+
+    def _reset_seeds(self):
+        """
+        Reset the random stream of each DSA model before a run. Sequential runs advance the streams of the models in 
+        this process, while parallel runs advance copies in the worker processes, so repeated runs only match if reset.
+        """
+        if self._root_seed is None:
+            return
+        for country, country_seed in self._country_seeds().items():
+            if country in self.models:
+                self.models[country].seed = country_seed
+                self.models[country]._seed_sequence = country_seed
+
     def update_params(self, update_params):
         """
         Update the attributes of each DSA model.
@@ -91,7 +118,7 @@ class GroupDsaModel:
                 if discard_models:
                     del self.models[country]
 
-    def find_spb_binding(self, edp_countries=[], parallel=True, max_workers=None, discard_models=False, **find_binding_params):
+    def find_spb_binding(self, edp_countries=[], parallel=True, max_workers=None, threads=None, discard_models=False, **find_binding_params):
         """
         Run the binding SPB analysis for each country.
 
@@ -100,9 +127,12 @@ class GroupDsaModel:
             parallel (bool): If True (default), run tasks in parallel using ProcessPoolExecutor;
                              if False, process tasks sequentially.
             max_workers (int): Maximum number of worker processes to use (default is the number of CPUs*5).
+            threads (int): Number of simulation kernel threads per model (default splits CPUs between workers).
             discard_models (bool): If True, delete the model from memory after processing.
             **find_binding_params: dict of additional parameters for find_spb_binding.
         """
+        self._set_threads(threads, parallel, max_workers)
+        self._reset_seeds()
         tasks = []
         print(f'Running find_spb_binding for {len(self.countries)} countries (parallel={parallel})')
         for country, model in list(self.models.items()):
@@ -110,7 +140,7 @@ class GroupDsaModel:
         
         if parallel:
             with ProcessPoolExecutor(max_workers=max_workers) as executor:
-                futures = [executor.submit(_find_spb_binding_task, task) for task in tasks]
+                futures = {executor.submit(_find_spb_binding_task, task): task[0] for task in tasks}
                 for future in tqdm(as_completed(futures), total=len(futures)):
                     try:
                         country, spb_dict, df_dict, binding_params, df_fanchart = future.result()
@@ -121,11 +151,13 @@ class GroupDsaModel:
                         if discard_models:
                             del self.models[country]
                     except Exception as e:
-                        print(f"Error processing binding tasks {e}")
+                        self.results[futures[future]]['error'] = e
+                        print(f"Error processing binding task for {futures[future]}: {e}")
         else:
             # Sequential processing using a simple loop.
             for task in tqdm(tasks):
                 try:
+                    country = task[0]
                     country, spb_dict, df_dict, binding_params, df_fanchart = _find_spb_binding_task(task)
                     self.results[country]['spb_target_dict'] = spb_dict
                     self.results[country]['df_dict'] = df_dict
@@ -134,9 +166,10 @@ class GroupDsaModel:
                     if discard_models:
                         del self.models[country]
                 except Exception as e:
+                    self.results[country]['error'] = e
                     print(f"Error processing binding task for {country}: {e}")
 
-    def find_spb_stochastic(self, store_as='stochastic', parallel=True, max_workers=None, discard_models=False, **find_stochastic_params):
+    def find_spb_stochastic(self, store_as='stochastic', parallel=True, max_workers=None, threads=None, discard_models=False, **find_stochastic_params):
         """
         Run the stochastic SPB analysis for each country.
 
@@ -145,9 +178,12 @@ class GroupDsaModel:
             parallel (bool): If True (default), run tasks in parallel using ProcessPoolExecutor;
                              if False, process tasks sequentially.
             max_workers (int): Maximum number of worker processes to use (default is the number of CPUs*5).
+            threads (int): Number of simulation kernel threads per model (default splits CPUs between workers).
             discard_models (bool): If True, delete the model from memory after processing.
             **find_stochastic_params: dict of additional parameters for find_spb_stochastic.
         """
+        self._set_threads(threads, parallel, max_workers)
+        self._reset_seeds()
         tasks = []
         print(f'Running find_spb_stochastic for {len(self.countries)} countries (parallel={parallel})')
         for country, model in list(self.models.items()):
@@ -155,7 +191,7 @@ class GroupDsaModel:
         
         if parallel:
             with ProcessPoolExecutor(max_workers=max_workers) as executor:
-                futures = [executor.submit(_find_spb_stochastic_task, task) for task in tasks]
+                futures = {executor.submit(_find_spb_stochastic_task, task): task[0] for task in tasks}
                 for future in tqdm(as_completed(futures), total=len(futures)):
                     try:
                         country, spb_dict, df_dict, df_fanchart = future.result()
@@ -165,11 +201,13 @@ class GroupDsaModel:
                         if discard_models:
                             del self.models[country]
                     except Exception as e:
-                        print(f"Error processing stochastic tasks {e}")
+                        self.results[futures[future]]['error'] = e
+                        print(f"Error processing stochastic task for {futures[future]}: {e}")
         else:
             # Sequential processing using a simple loop.
             for task in tqdm(tasks):
                 try:
+                    country = task[0]
                     country, spb_dict, df_dict, df_fanchart = _find_spb_stochastic_task(task)
                     self.results[country]['spb_target_dict'] = spb_dict
                     self.results[country]['df_dict'] = df_dict
@@ -177,8 +215,26 @@ class GroupDsaModel:
                     if discard_models:
                         del self.models[country]
                 except Exception as e:
+                    self.results[country]['error'] = e
                     print(f"Error processing stochastic task for {country}: {e}")
 
+    def _set_threads(self, threads, parallel, max_workers):
+        """
+        Set number of simulation kernel threads for each DSA model.
+
+        Parameters:
+            threads (int): Number of threads per model. If None, CPUs are split evenly 
+            between the worker processes.
+            parallel (bool): Whether tasks run in parallel processes.
+            max_workers (int): Maximum number of worker processes.
+        """
+        if threads is None:
+            cpus = os.cpu_count() or 1
+            workers = min(max_workers or cpus, len(self.models)) if parallel else 1
+            threads = max(1, cpus // max(1, workers))
+        for model in self.models.values():
+            model.threads = threads
+
     def project_fr(self, store_as=False, discard_models=False, **fr_params):
         """
         Run the fiscal rule analysis for each DSA model.
@@ -221,7 +277,7 @@ class GroupDsaModel:
         # Build the SPB table from the results
         self.df_spb = pd.DataFrame()
         for country in self.results:
-            spb_target_dict = self.results[country]['spb_target_dict']
+            spb_target_dict = self.results[country].get('spb_target_dict', {})
             for scenario, spb_val in spb_target_dict.items():
                 temp_df = pd.DataFrame({
                     'country': [country],
@@ -301,7 +357,7 @@ class GroupDsaModel:
         file_path = os.path.join(folder_path, file)
         with pd.ExcelWriter(file_path) as writer:
             for country, res in self.results.items():
-                df_dict = res['df_dict']
+                df_dict = res.get('df_dict', {})
                 for scenario, df in df_dict.items():
                     # Limit the sheet name to 31 characters
                     sheet_name = f"{country}_{self.dsa_params['adjustment_period']}_{scenario}"[:31]
@@ -376,7 +432,7 @@ class GroupDsaModel:
         # Loop over each country to extract the desired scenario DataFrame and compute weights.
         for country in countries:
             # Access the dictionary containing DataFrames for the current country and period.
-            df_dict = self.results[country]['df_dict']
+            df_dict = self.results[country].get('df_dict', {})
             # Check if the specified scenario exists for this country.
             if scenario in df_dict:
                 df = df_dict[scenario]
@@ -0,0 +1,96 @@
+# ========================================================================================= #
+#               European Commission Debt Sustainability Analysis - Histogram Sketch Class   #
+# ========================================================================================= #
+#
+# This class implements a mergeable streaming quantile sketch based on fixed-bin histograms.
+# It is used by the chunked simulation mode of the StochasticDsaModel to calculate fanchart
+# percentiles without storing all simulated paths. Each column (e.g. each projection year)
+# has its own bin edges. Values outside the bin range are counted in underflow and overflow
+# bins, whose quantiles are interpolated towards the exact minimum and maximum.
+#
+# ========================================================================================= #
+
+# Import libraries and modules
+import numpy as np
+
+class HistogramSketch:
+    def __init__(self, lower, upper, bins=10000):
+        """
+        Initialize empty sketch with bins between lower and upper bound for each column.
+        """
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.bins = bins
+        self.width = (self.upper - self.lower) / bins
+        self.num_columns = self.lower.shape[0]
+
+        # Bin 0 counts underflow, bin bins+1 counts overflow
+        self.counts = np.zeros((self.num_columns, bins + 2), dtype=np.int64)
+        self.min = np.full(self.num_columns, np.inf)
+        self.max = np.full(self.num_columns, -np.inf)
+        self.n = np.zeros(self.num_columns, dtype=np.int64)
+
+    @classmethod
+    def from_sample(cls, values, bins=10000, margin=1.0):
+        """
+        Create sketch with bin range of a sample widened by margin times its range on both sides.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        lower = np.nanmin(values, axis=0)
+        upper = np.nanmax(values, axis=0)
+        span = np.where(upper > lower, upper - lower, 1.0)
+        return cls(lower - margin * span, upper + margin * span, bins)
+
+    def update(self, values):
+        """
+        Add a (n, num_columns) array of values to the sketch, NaN values are ignored.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        for j in range(self.num_columns):
+            column = values[:, j]
+            column = column[~np.isnan(column)]
+            if column.size == 0:
+                continue
+            idx = np.clip(np.floor((column - self.lower[j]) / self.width[j]), -1, self.bins).astype(np.int64) + 1
+            self.counts[j] += np.bincount(idx, minlength=self.bins + 2)
+            self.min[j] = min(self.min[j], column.min())
+            self.max[j] = max(self.max[j], column.max())
+            self.n[j] += column.size
+
+    def merge(self, other):
+        """
+        Merge another sketch with identical bins into this sketch.
+        """
+        assert (self.bins == other.bins
+                and np.array_equal(self.lower, other.lower)
+                and np.array_equal(self.upper, other.upper)), 'Sketches have different bins!'
+        self.counts += other.counts
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.n += other.n
+        return self
+
+    def quantile(self, q):
+        """
+        Return quantile q (between 0 and 1, scalar or array) of each column, linear interpolation within bins.
+        Returns array of shape (num_columns,) for scalar q and (len(q), num_columns) otherwise.
+        """
+        q_array = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        result = np.full((q_array.shape[0], self.num_columns), np.nan)
+        for j in range(self.num_columns):
+            if self.n[j] == 0:
+                continue
+
+            # Bin edges including underflow and overflow bins bounded by exact min and max
+            edges = self.lower[j] + self.width[j] * np.arange(self.bins + 1)
+            edges = np.concatenate(([min(self.min[j], edges[0])], edges, [max(self.max[j], edges[-1])]))
+
+            # Find bins containing the ranks and interpolate within them
+            cum_counts = np.cumsum(self.counts[j])
+            rank = q_array * self.n[j]
+            k = np.minimum(np.searchsorted(cum_counts, rank, side='left'), self.bins + 1)
+            below = np.where(k > 0, cum_counts[k - 1], 0)
+            counts = self.counts[j, k]
+            share = np.where(counts > 0, (rank - below) / np.maximum(counts, 1), 0)
+            result[:, j] = np.clip(edges[k] + share * (edges[k + 1] - edges[k]), self.min[j], self.max[j])
+        return result[0] if np.ndim(q) == 0 else result
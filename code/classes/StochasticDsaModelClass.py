@@ -24,21 +24,79 @@
 
 # Import libraries and modules
 import os
+import bisect
+import warnings
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 # import seaborn color palatte
 import seaborn as sns
 from scipy.optimize import minimize_scalar
+from scipy.stats import norm, qmc, t as t_dist
 from statsmodels.tsa.api import VAR
-from numba import jit
+import numba
+from numba import jit, prange
 from classes import DsaModel
+from classes.exceptions import NoSolution
+from classes.HistogramSketchClass import HistogramSketch
+
+# Use workqueue threading layer unless set by user, GroupDsaModel forks worker processes after kernels ran in the
+# parent, which can deadlock the TBB layer at exit. Kernels are only launched from one thread per process.
+if 'NUMBA_THREADING_LAYER' not in os.environ:
+    numba.config.THREADING_LAYER = 'workqueue'
 
 class StochasticDsaModel(DsaModel):
 
 # ========================================================================================= #
 #                               INIITIALIZE SUBCLASS                                        #
 # ========================================================================================= #
+
+    # Number of draws per random stream, streams do not depend on the number of threads
+    stream_block_size = 2**14
+
+    # Child of the model seed drawn by the deficit simulation, beyond the children spawned by simulations
+    deficit_stream_key = 2**32 - 1
+
+    # Maximum number of paths added by adaptive simulation
+    adaptive_max_N = 2**21
+
+    # Number of independent blocks of paths for batch-means confidence intervals of the SPB target
+    ci_blocks = 20
+
+    # Largest SPB step of the probability slope at the target, the step is doubled while the criterion is flat
+    max_slope_step = 1.6
+
+    # Number of evenly spaced quantile points compared by the debt stable criterion
+    debt_stable_quantiles = 10000
+
+    # Fitted VAR parameters and shock data files are shared by all models in a process
+    _var_cache = {}
+    _shock_data_cache = {}
+
+    # Directory to also store fitted VAR parameters on disk, None keeps them in memory only
+    var_cache_dir = None
+
+    # Directory of stored aggregated shocks, mapped by later simulations with the same key, None redraws shocks
+    shock_store_dir = None
+
+    # Maximum size of stored shocks in bytes, least recently used files are removed first, None keeps all files
+    shock_store_max_bytes = 2**32
+
+    # Stochastic configuration and simulated paths replaced during the deficit probability simulation
+    _deficit_simulation_attributes = [
+        'stochastic_start', 'stochastic_end', 'stochastic_period', 'draw_period', 'cov_matrix', 'shocks_sim_draws', 
+        'shocks_sim_grouped', 'long_term_interest_rate_shocks', 'shocks_sim', 'd_sim', 'exr_eur_sim', 'exr_usd_sim', 
+        'iir_sim', 'ng_sim', 'pb_sim', 'sf_sim', 'ob_sim', '_sorted_sim_cache', '_percentile_cache', 'sim_sketches'
+        ]
+
+    # Simulated shocks and paths released in summary retention mode
+    _simulation_buffers = [
+        'shocks_sim_draws', 'shocks_sim_grouped', 'shocks_sim', 'long_term_interest_rate_shocks', 'd_sim', 'exr_eur_sim', 
+        'exr_usd_sim', 'iir_sim', 'ng_sim', 'pb_sim', 'sf_sim', 'ob_sim', '_sorted_sim_cache'
+        ]
+
     def __init__(self, 
                 country, # ISO code of country
                 start_year=2024, # start year of projection, first year is baseline value
@@ -56,6 +114,17 @@ class StochasticDsaModel(DsaModel):
                 fiscal_multiplier_persistence=3,
                 fiscal_multiplier_type='ec',
                 bond_data=False, # Use bond level data for repayment profile
+                threads=None, # number of threads for parallel simulation kernels, None uses all cores
+                dtype='float64', # floating point precision of simulated shocks and paths, 'float32' halves memory
+                N=100000, # number of simulated paths
+                chunk_size=None, # if set, simulate in chunks of this many paths without storing all paths
+                antithetic=False, # draw shocks in antithetic pairs, normal and var_cholesky estimation only
+                control_variate=False, # use linearized debt recursion as control variate for probabilities
+                se_tolerance=None, # if set, add paths until standard error of the active criterion probability is below it
+                spb_tolerance=None, # if set, add paths until implied standard error of the SPB target is below it
+                rng='pseudo', # 'pseudo' for pseudo-random, 'sobol' for scrambled Sobol (N rounded up to a power of two) or 'splitmix' for fused in-kernel shock draws
+                seed=None, # int, SeedSequence or Generator for reproducible draws, None seeds from global np.random state
+                keep='all', # 'all' keeps simulated shocks and paths, 'summary' only probabilities and fanchart percentiles
                 ): 
         
         # Initialize base class
@@ -89,6 +158,23 @@ class StochasticDsaModel(DsaModel):
         elif shock_frequency == 'annual':
             self.draw_period = stochastic_period
         self.winsorize_sample = winsorize_sample
+        self.threads = threads
+        assert dtype in ['float64', 'float32'], 'Unknown simulation dtype'
+        self.dtype = np.dtype(dtype)
+        self.N = N
+        self.chunk_size = chunk_size
+        assert not (antithetic and estimation == 'var_bootstrap'), 'Bootstrapped residuals are skewed and cannot be mirrored'
+        self.antithetic = antithetic
+        self.control_variate = control_variate
+        self.se_tolerance = se_tolerance
+        self.spb_tolerance = spb_tolerance
+        assert rng in ['pseudo', 'sobol', 'splitmix'], 'Unknown random number generator'
+        self.rng = rng
+        self._round_sobol_paths()
+        self.seed = seed
+        self._seed_sequence = self._make_seed_sequence(seed)
+        assert keep in ['all', 'summary'], 'Unknown retention mode'
+        self.keep = keep
         
         # Get shock data
         self._get_shock_data()
@@ -99,7 +185,7 @@ class StochasticDsaModel(DsaModel):
         """
         # Read country shock data and get number of variables for quarterly data
         if self.shock_frequency == 'quarterly':
-            self.df_shocks = pd.read_csv(self._base_dir + 'data/InputData/stochastic_data_quarterly.csv').set_index('YEAR')
+            self.df_shocks = self._read_shock_data('quarterly')
             self.df_shocks = self.df_shocks.loc[self.df_shocks['COUNTRY'] == self.country]
             self.df_shocks.index = pd.PeriodIndex(self.df_shocks.index, freq='Q')
 
@@ -111,7 +197,7 @@ class StochasticDsaModel(DsaModel):
         
         # Read country shock data for annual data        
         if self.shock_frequency == 'annual':
-            self.df_shocks = pd.read_csv(self._base_dir + 'data/InputData/stochastic_data_annual.csv').set_index('YEAR')
+            self.df_shocks = self._read_shock_data('annual')
             self.df_shocks = self.df_shocks.loc[self.df_shocks['COUNTRY'] == self.country]
             self.df_shocks.index = pd.PeriodIndex(self.df_shocks.index, freq='Y')
 
@@ -132,29 +218,171 @@ class StochasticDsaModel(DsaModel):
                 upper=self.df_shocks.quantile(0.95, axis=0),
                 axis=1
                 )
+
+    def _read_shock_data(self, frequency):
+        """
+        Read quarterly or annual shock data file, memoized per process until the file changes. 
+        The returned DataFrame is shared and must not be modified in place.
+        """
+        path = os.path.abspath(self._base_dir + f'data/InputData/stochastic_data_{frequency}.csv')
+        key = (path, os.path.getmtime(path))
+        if key not in StochasticDsaModel._shock_data_cache:
+            StochasticDsaModel._shock_data_cache[key] = pd.read_csv(path).set_index('YEAR')
+        return StochasticDsaModel._shock_data_cache[key]
+
+    def shock_sample_sweep(self, sample_starts, winsorize=None, quantiles=(0.05, 0.95)):
+        """
+        Return number of observations, covariance matrix and, if winsorized, winsorization bounds of the shock sample 
+        for each start year in sample_starts, as a dict by start year. winsorize defaults to winsorize_sample.
+        
+        Samples end with the last observation and are nested, so they are built in one backward pass over the shock 
+        history. The mean and co-moment matrix are updated with Welford rank-one updates, and quantile bounds from 
+        sorted insertion. Winsorized samples are clipped at their own bounds, as in _get_shock_data, which is not a 
+        rank-one update, so their covariance is calculated from the clipped sample. A covariance can be passed to the 
+        simulation by setting shock_cov_matrix.
+        """
+        if winsorize is None:
+            winsorize = self.winsorize_sample
+
+        # Shock history of country, incomplete observations are skipped
+        df_history = self._read_shock_data(self.shock_frequency)
+        df_history = df_history.loc[df_history['COUNTRY'] == self.country, self.df_shocks.columns].dropna()
+        years = df_history.index.astype(str).str[:4].astype(int).values
+        values = df_history.values.astype(np.float64)
+        order = np.argsort(years, kind='stable')
+        years, values = years[order], values[order]
+
+        # Add observations from the latest, save statistics when passing a sample start
+        starts = sorted(set(sample_starts), reverse=True)
+        n = 0
+        mean = np.zeros(self.num_variables)
+        comoment = np.zeros((self.num_variables, self.num_variables))
+        sorted_values = [[] for _ in range(self.num_variables)]
+        sweep = {}
+        i = len(years) - 1
+        for start in starts:
+            while i >= 0 and years[i] >= start:
+                x = values[i]
+                n += 1
+                delta = x - mean
+                mean += delta / n
+                comoment += np.outer(delta, x - mean)
+                if winsorize:
+                    for j in range(self.num_variables):
+                        bisect.insort(sorted_values[j], x[j])
+                i -= 1
+
+            assert n > 1, f'Not enough shock observations from {start}'
+            window = {'n': n}
+            if not winsorize:
+                window['cov'] = pd.DataFrame(comoment / (n - 1), index=self.df_shocks.columns, columns=self.df_shocks.columns)
+            else:
+                # Quantiles interpolated linearly between order statistics, as pandas quantile
+                bounds = []
+                for q in quantiles:
+                    position = q * (n - 1)
+                    lower_idx = int(np.floor(position))
+                    upper_idx = min(lower_idx + 1, n - 1)
+                    bounds.append([
+                        sorted_values[j][lower_idx] + (position - lower_idx) * (sorted_values[j][upper_idx] - sorted_values[j][lower_idx])
+                        for j in range(self.num_variables)
+                        ])
+                window['lower'] = pd.Series(bounds[0], index=self.df_shocks.columns)
+                window['upper'] = pd.Series(bounds[1], index=self.df_shocks.columns)
+                clipped = np.clip(values[i + 1:], bounds[0], bounds[1])
+                window['cov'] = pd.DataFrame(np.cov(clipped.T), index=self.df_shocks.columns, columns=self.df_shocks.columns)
+            sweep[start] = window
+
+        return {start: sweep[start] for start in sample_starts}
+
+    def _shock_cov_matrix(self):
+        """
+        Return covariance matrix of the shocks as a DataFrame. Uses shock_cov_matrix if set, e.g. from shock_sample_sweep, 
+        otherwise the covariance of the shock sample.
+        """
+        if hasattr(self, 'shock_cov_matrix'): # attribute can be set to simulate with a given covariance
+            return self.shock_cov_matrix
+        return self.df_shocks.cov()
+
+    def _fit_var(self, var_sample, lags=1):
+        """
+        Return fitted VAR parameters (lags, intercept, coefs, params, columns, residuals, chol_matrix) of var_sample.
+        If lags is 'bic', the lag order is selected by BIC. Parameters are memoized per process by country, frequency, 
+        sample start, winsorization, lags and sample values, and stored in var_cache_dir if set, so repeated simulations 
+        skip the estimation.
+        """
+        # Key includes a fingerprint of the sample in case shock data was changed
+        sample_values = np.ascontiguousarray(var_sample.values, dtype=np.float64)
+        fingerprint = hashlib.sha1(sample_values.tobytes() + str(list(var_sample.columns)).encode()).hexdigest()
+        key = (self.country, self.shock_frequency, self.shock_sample_start, self.winsorize_sample, lags, fingerprint)
+        if key in StochasticDsaModel._var_cache:
+            return StochasticDsaModel._var_cache[key]
+
+        # Load parameters from disk if available
+        path = None
+        if self.var_cache_dir is not None:
+            path = os.path.join(self.var_cache_dir, f'var_{self.country}_{hashlib.sha1(repr(key).encode()).hexdigest()}.npz')
+        if path is not None and os.path.exists(path):
+            with np.load(path) as var_file:
+                var_params = {name: var_file[name] for name in var_file.files}
+            var_params['lags'] = int(var_params['lags'])
+            var_params['columns'] = [str(column) for column in var_params['columns']]
+
+        # Otherwise estimate VAR model
+        else:
+            varmodel = VAR(var_sample)
+            results = varmodel.fit(ic='bic') if lags == 'bic' else varmodel.fit(lags)
+            residuals = np.asarray(results.resid.values, dtype=np.float64)
+            var_params = {
+                'lags': int(results.k_ar),
+                'intercept': results.params.iloc[0].values,
+                'coefs': results.coefs,
+                'params': results.params.values,
+                'columns': list(results.params.columns),
+                'residuals': residuals,
+                'chol_matrix': self._cov_factor(np.cov(residuals.T)),
+                }
+            if path is not None:
+                os.makedirs(self.var_cache_dir, exist_ok=True)
+                np.savez(path, **{name: np.asarray(value) for name, value in var_params.items()})
+
+        StochasticDsaModel._var_cache[key] = var_params
+        return var_params
         
 # ========================================================================================= #
 #                               SIMULATION METHODS                                          #
 # ========================================================================================= #
 
-    def simulate(self, N=100000):
+    def simulate(self, N=None, chunk_size=None):
         """
-        Simulate the stochastic model.
+        Simulate the stochastic model. N and chunk_size default to the model attributes.
+        In chunked mode, paths are not stored and fanchart percentiles are kept in histogram sketches.
         """
         # Set number of simulations
-        self.N = N
+        if N is not None:
+            self.N = N
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+        self._round_sobol_paths()
+        self._set_num_threads()
+
+        # Variance reduction needs all paths at once
+        if self._chunked() and (getattr(self, 'control_variate', False) or getattr(self, 'antithetic', False)):
+            warnings.warn(
+                'Antithetic estimator and control variate are not applied in chunked simulation, '
+                'probabilities are plain Monte Carlo estimates'
+                )
 
-        # Draw shocks from a multivariate normal distribution or VAR model
-        if self.estimation == 'normal': 
-            self._draw_shocks_normal()
-        elif self.estimation in ['var_cholesky', 'var_bootstrap']: 
-            self._draw_shocks_var()
+        # Spawn random stream of this simulation, chunks draw from its children
+        self._simulation_seed = self._spawn_seed()
 
-        # Aggregate quarterly shocks to annual shocks
-        if self.shock_frequency == 'quarterly': 
-            self._aggregate_shocks_quarterly()
-        elif self.shock_frequency == 'annual': 
-            self._aggregate_shocks_annual()
+        # Simulate path sketches in chunked mode
+        if self._chunked():
+            self._simulate_path_sketches()
+            return
+
+        # Draw shocks and aggregate them to annual shocks
+        self._draw_aggregate_shocks(self._simulation_seed)
                 
         # Add shocks to baseline variables and set start values
         self._combine_shocks_baseline()
@@ -162,7 +390,176 @@ class StochasticDsaModel(DsaModel):
         # Simulate debt
         self._simulate_debt()
 
-    def _draw_shocks_normal(self):
+    def _set_num_threads(self):
+        """
+        Set number of threads used by parallel simulation kernels.
+        """
+        if getattr(self, 'threads', None) is not None:
+            numba.set_num_threads(max(1, min(self.threads, numba.config.NUMBA_NUM_THREADS)))
+
+    def _chunked(self):
+        """
+        Check if simulation runs in chunks.
+        """
+        return getattr(self, 'chunk_size', None) is not None and self.chunk_size < self.N
+
+    def _num_chunks(self):
+        """
+        Number of simulation chunks.
+        """
+        return -(-self.N // self.chunk_size)
+
+    def _draw_chunk(self, i):
+        """
+        Draw and aggregate shocks of chunk i from its own random stream, so every pass over the chunks reuses the same shocks.
+        Returns number of paths in chunk.
+        """
+        N = self.N
+        chunk_N = min(self.chunk_size, N - i * self.chunk_size)
+        chunk_seed = self._child_seed(self._simulation_seed, i)
+        try:
+            self.N = chunk_N
+            self._draw_aggregate_shocks(chunk_seed)
+        finally:
+            self.N = N
+        return chunk_N
+
+    def _draw_aggregate_shocks(self, seed_sequence):
+        """
+        Draw shocks from a multivariate normal distribution or VAR model and aggregate them to annual shocks.
+        With the splitmix generator, normal shocks are drawn and aggregated in one kernel without storing the draws.
+        If shock_store_dir is set, stored shocks are mapped without copying, and new shocks are stored. Maps are 
+        copy-on-write, so kernels compiled for drawn shocks are reused and the stored file is never changed. Draws of 
+        stored shocks are not kept, the covariance matrix is set as if they had been drawn.
+        """
+        # Map stored shocks, drawn shocks of earlier simulations are removed
+        path = self._shock_store_path(seed_sequence)
+        if path is not None and os.path.exists(path):
+            self.shocks_sim = np.asarray(np.load(path, mmap_mode='c'))
+            os.utime(path) # mark as recently used
+            for var in ['shocks_sim_draws', 'shocks_sim_grouped', 'long_term_interest_rate_shocks']:
+                if hasattr(self, var):
+                    delattr(self, var)
+            if self.estimation == 'normal':
+                self.cov_matrix = self._shock_cov_matrix()
+            return
+
+        if self.estimation == 'normal' and self._fused_draws():
+            self._draw_aggregate_shocks_fused(seed_sequence)
+        else:
+            # Draw shocks from a multivariate normal distribution or VAR model
+            if self.estimation == 'normal': 
+                self._draw_shocks_normal(seed_sequence)
+            elif self.estimation in ['var_cholesky', 'var_bootstrap']: 
+                self._draw_shocks_var(seed_sequence)
+
+            # Aggregate quarterly shocks to annual shocks
+            if self.shock_frequency == 'quarterly': 
+                self._aggregate_shocks_quarterly()
+            elif self.shock_frequency == 'annual': 
+                self._aggregate_shocks_annual()
+
+        # Write to temporary file first, so concurrent processes never map a partial file
+        if path is not None:
+            os.makedirs(self.shock_store_dir, exist_ok=True)
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as shock_file:
+                np.save(shock_file, self.shocks_sim)
+            os.replace(temp_path, path)
+            self._evict_shock_store(keep=path)
+
+    def _shock_store_path(self, seed_sequence):
+        """
+        Return path of aggregated shocks in shock_store_dir, None if no store is set. The key contains the country, 
+        estimation, frequency, sample, N, seed, stochastic period, dtype, generator and PB zeroing, as well as the debt 
+        structure used for aggregation and a fingerprint of the shock data. Without a seed, shocks are not stored, as 
+        fresh entropy makes every key unique.
+        """
+        if self.shock_store_dir is None or getattr(self, 'seed', None) is None:
+            return None
+        shock_values = np.ascontiguousarray(self.df_shocks.values, dtype=np.float64)
+        if hasattr(self, 'shock_cov_matrix'):
+            shock_values = np.concatenate([shock_values.ravel(), np.asarray(self.shock_cov_matrix, dtype=np.float64).ravel()])
+        key = (
+            self.country, self.estimation, self.shock_frequency, self.shock_sample_start, self.winsorize_sample, self.N, 
+            seed_sequence.entropy, seed_sequence.spawn_key, self.stochastic_start, self.stochastic_period, self.dtype.str, 
+            getattr(self, 'rng', 'pseudo'), getattr(self, 'antithetic', False), self.stream_block_size, 
+            hasattr(self, 'stochastic_pb_adjustment'), self.adjustment_end, float(self.avg_res_mat), 
+            float(self.D_share_st), float(self.D_share_lt), hashlib.sha1(shock_values.tobytes()).hexdigest()
+            )
+        file = (f'shocks_{self.country}_{self.estimation}_{self.shock_frequency}_{self.shock_sample_start}_{self.N}_'
+                f'{hashlib.sha1(repr(key).encode()).hexdigest()}.npy')
+        return os.path.join(self.shock_store_dir, file)
+
+    def _evict_shock_store(self, keep=None):
+        """
+        Remove least recently used stored shocks until the store is below shock_store_max_bytes. The file keep is not removed.
+        """
+        if self.shock_store_max_bytes is None:
+            return
+        files = []
+        for entry in os.scandir(self.shock_store_dir):
+            if entry.name.startswith('shocks_') and entry.name.endswith('.npy'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError: # removed by concurrent process
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in files)
+        for _, size, file_path in sorted(files):
+            if total_bytes <= self.shock_store_max_bytes:
+                break
+            if file_path == keep:
+                continue
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    @classmethod
+    def clear_shock_store(cls, shock_store_dir=None):
+        """
+        Remove all stored shocks from shock_store_dir, defaults to the class store.
+        """
+        shock_store_dir = cls.shock_store_dir if shock_store_dir is None else shock_store_dir
+        if shock_store_dir is None or not os.path.isdir(shock_store_dir):
+            return
+        for entry in os.scandir(shock_store_dir):
+            if entry.name.startswith('shocks_') and (entry.name.endswith('.npy') or entry.name.endswith('.tmp')):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def _simulate_path_sketches(self, bins=10000):
+        """
+        Simulate paths chunk by chunk and collect their distribution in histogram sketches for the fanchart.
+        """
+        self.sim_sketches = {}
+        self._percentile_cache = {}
+        N = self.N
+        for i in range(self._num_chunks()):
+            chunk_N = self._draw_chunk(i)
+            try:
+                self.N = chunk_N
+                self._combine_shocks_baseline()
+                self._simulate_debt()
+            finally:
+                self.N = N
+
+            # Bins are set by first chunk, later chunks can fall in overflow bins
+            for var in ['d', 'exr_eur', 'exr_usd', 'iir', 'ng', 'pb', 'sf']:
+                sim_var = getattr(self, f'{var}_sim')
+                if var not in self.sim_sketches:
+                    self.sim_sketches[var] = HistogramSketch.from_sample(sim_var, bins=bins)
+                self.sim_sketches[var].update(sim_var)
+
+        # Remove paths of last chunk
+        for var in self.sim_sketches:
+            delattr(self, f'{var}_sim')
+
+    def _draw_shocks_normal(self, seed_sequence=None, cov_matrix=None):
         """
         Draw quarterly or annual shocks from a multivariate normal distribution.
 
@@ -171,17 +568,30 @@ class StochasticDsaModel(DsaModel):
 
         It reshapes the shocks into a 4-dimensional array of shape (N, draw_period, num_variables), where N is the number of simulations,
         draw_period is the number of consecutive years or quarters drawn, and num_variables is the number of shock variables.
+        Draws come from streams derived from seed_sequence, a new stream is spawned from the model seed if None.
+        A covariance matrix can be passed instead of the one of the shock DataFrame.
         """
+        if seed_sequence is None:
+            seed_sequence = self._spawn_seed()
 
-        # Calculate the covariance matrix of the shock DataFrame
-        self.cov_matrix = self.df_shocks.cov()
+        # Calculate the covariance matrix of the shock DataFrame and get its cached factor
+        self.cov_matrix = self._shock_cov_matrix() if cov_matrix is None else cov_matrix
+        factor = self._cached_cov_factor(self.cov_matrix)
 
         # Draw samples of quarterly shocks from a multivariate normal distribution
-        self.shocks_sim_draws = np.random.multivariate_normal(
-            mean=np.zeros(self.cov_matrix.shape[0]),
-            cov=self.cov_matrix,
-            size=(self.N, self.draw_period)
-            )
+        if self._sobol():
+            self.shocks_sim_draws = (
+                self._sobol_normal((self._num_draws(), self.draw_period, self.num_variables), seed_sequence) 
+                @ factor.T
+                ).astype(self.dtype, copy=False)
+        else:
+            self.shocks_sim_draws = np.empty((self.N, self.draw_period, self.num_variables), dtype=self.dtype)
+            self._draw_blocks(
+                lambda generator, out: self._fill_correlated_normal(generator, out, factor),
+                self.shocks_sim_draws[:self._num_draws()], 
+                seed_sequence
+                )
+        self.shocks_sim_draws = self._mirror_draws(self.shocks_sim_draws)
         
         # Set PB shocks during adjustment period to zero
         if not hasattr(self, 'stochastic_pb_adjustment'): # attribute can be set if adjustment is already included
@@ -190,38 +600,203 @@ class StochasticDsaModel(DsaModel):
             if stochastic_within_adjustment > 0:
                 self.shocks_sim_draws[:, :stochastic_within_adjustment, -1] = 0
         
-    def _draw_shocks_var(self):
+    def _sobol(self):
+        """
+        Check if shocks are drawn from scrambled Sobol sequences.
+        """
+        return getattr(self, 'rng', 'pseudo') == 'sobol'
+
+    def _sobol_uniform(self, size, seed_sequence):
+        """
+        Draw uniform numbers of given size from a scrambled Sobol sequence. Each row (first axis) is one point of the 
+        sequence, the remaining axes are its dimensions. The scrambling is seeded from seed_sequence, so independent 
+        randomizations allow error estimates. The sequence is not split into blocks to keep its balance properties, which 
+        only hold for a power of two of points.
+        """
+        m = int(np.log2(size[0]))
+        assert size[0] == 2**m, 'Number of Sobol points must be a power of two'
+        sampler = qmc.Sobol(d=int(np.prod(size[1:])), scramble=True, seed=np.random.default_rng(seed_sequence))
+        return sampler.random_base2(m).reshape(size)
+
+    def _round_sobol_paths(self):
+        """
+        Round the number of paths and the chunk size up, so that each Sobol draw is a power of two of points.
+        """
+        if not self._sobol():
+            return
+        pairs = 2 if getattr(self, 'antithetic', False) else 1
+        def round_paths(N):
+            return pairs * 2**int(np.ceil(np.log2(-(-N // pairs))))
+        self.N = round_paths(self.N)
+        if getattr(self, 'chunk_size', None) is not None:
+            self.chunk_size = round_paths(self.chunk_size)
+
+    def _sobol_normal(self, size, seed_sequence):
+        """
+        Draw standard normal numbers from a scrambled Sobol sequence via the inverse normal CDF.
+        """
+        uniform_draws = np.clip(self._sobol_uniform(size, seed_sequence), 1e-12, 1 - 1e-12)
+        return norm.ppf(uniform_draws)
+
+    @staticmethod
+    def _cov_factor(cov_matrix):
+        """
+        Return factor L with L @ L.T = cov_matrix. Uses the Cholesky factor and falls back to the eigen decomposition 
+        for singular covariance matrices, e.g. with zeroed shock variables.
+        """
+        try:
+            return np.linalg.cholesky(cov_matrix)
+        except np.linalg.LinAlgError:
+            eigenvalues, eigenvectors = np.linalg.eigh(cov_matrix)
+            return eigenvectors * np.sqrt(np.maximum(eigenvalues, 0))
+
+    def _cached_cov_factor(self, cov_matrix):
+        """
+        Return factor of covariance matrix, memoized by its values so repeated simulations skip the decomposition.
+        """
+        cov_matrix = np.ascontiguousarray(cov_matrix, dtype=np.float64)
+        if not hasattr(self, '_cov_factor_cache'):
+            self._cov_factor_cache = {}
+        key = (cov_matrix.shape, cov_matrix.tobytes())
+        if key not in self._cov_factor_cache:
+            self._cov_factor_cache[key] = self._cov_factor(cov_matrix)
+        return self._cov_factor_cache[key]
+
+    @staticmethod
+    def _fill_correlated_normal(generator, out, factor):
+        """
+        Fill out with standard normal draws in its dtype and correlate them with factor, one matrix product per block.
+        """
+        generator.standard_normal(dtype=out.dtype, out=out)
+        flat = out.reshape(-1, out.shape[-1])
+        np.matmul(flat, factor.T.astype(out.dtype, copy=False), out=flat)
+
+    def _num_draws(self):
+        """
+        Number of independent draws, half of the paths if antithetic pairs are used.
+        """
+        return -(-self.N // 2) if getattr(self, 'antithetic', False) else self.N
+
+    def _mirror_draws(self, draws):
+        """
+        Append mirrored draws for antithetic sampling, path n and path n + N/2 form a pair. If draws already has N rows, 
+        its first half is drawn and the second half is filled in place.
+        """
+        if not getattr(self, 'antithetic', False):
+            return draws
+        num_draws = self._num_draws()
+        if draws.shape[0] == self.N:
+            np.negative(draws[:self.N - num_draws], out=draws[num_draws:])
+            return draws
+        return np.concatenate([draws, -draws])[:self.N]
+
+    @staticmethod
+    def _make_seed_sequence(seed=None):
+        """
+        Return root SeedSequence of the model from an int, SeedSequence or Generator. If seed is None, entropy is drawn 
+        from the global np.random state, so np.random.seed still makes runs reproducible.
+        """
+        if isinstance(seed, np.random.SeedSequence):
+            return seed
+        if isinstance(seed, np.random.Generator):
+            return np.random.SeedSequence(seed.integers(0, 2**32, size=4))
+        if seed is None:
+            return np.random.SeedSequence(np.random.randint(0, 2**32, size=4))
+        return np.random.SeedSequence(seed)
+
+    def _spawn_seed(self):
+        """
+        Spawn an independent seed sequence for a new set of draws from the model root sequence.
+        """
+        if not hasattr(self, '_seed_sequence'):
+            self._seed_sequence = self._make_seed_sequence(getattr(self, 'seed', None))
+        return self._seed_sequence.spawn(1)[0]
+
+    @staticmethod
+    def _child_seed(seed_sequence, i):
+        """
+        Return the i-th child of a seed sequence. Unlike spawn, this does not advance the parent, so repeated passes 
+        over chunks or blocks reuse the same streams.
+        """
+        return np.random.SeedSequence(
+            seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + (i,), pool_size=seed_sequence.pool_size
+            )
+
+    def _draw_blocks(self, fill_block, out, seed_sequence):
+        """
+        Fill the rows of preallocated array out in blocks of stream_block_size, each block from its own child stream 
+        of seed_sequence. fill_block(generator, out_block) draws into a block in place. Blocks are drawn in parallel 
+        threads, since the blocks and their streams are fixed, draws are bit-identical for any number of threads.
+        """
+        block_size = self.stream_block_size
+        num_blocks = -(-out.shape[0] // block_size)
+
+        def draw(i):
+            generator = np.random.default_rng(self._child_seed(seed_sequence, i))
+            fill_block(generator, out[i * block_size:(i + 1) * block_size])
+
+        threads = min(numba.get_num_threads(), num_blocks)
+        if threads > 1:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(draw, range(num_blocks)))
+        else:
+            for i in range(num_blocks):
+                draw(i)
+        return out
+
+    def _draw_shocks_var(self, seed_sequence=None):
         """
         Draw quarterly or annual shocks from a VAR model.
 
         This method estimates a VAR model on the shock DataFrame and then draws N samples of quarterly shocks from the residuals of the VAR 
         model using a bootstrap method. It reshapes the shocks into a 4-dimensional array of shape (N, draw_period, num_variables) where N is the
         number of simulations, draw_period is the number of consecutive years or quarters drawn, and num_variables is the number of shock variables.
+        Draws come from streams derived from seed_sequence, a new stream is spawned from the model seed if None.
         """
+        if seed_sequence is None:
+            seed_sequence = self._spawn_seed()
+
         # Define sample for VAR model, exclude exr_eur_shock for EA countries and DNK
         ea_countries = ['AUT', 'BEL', 'BGR', 'DNK', 'HRV', 'CYP', 'EST', 'FIN', 'FRA', 'DEU', 'GRC', 'IRL', 'ITA', 'LVA', 'LTU', 'LUX', 'MLT', 'NLD', 'PRT', 'SVK', 'SVN', 'ESP']
         var_sample = self.df_shocks.copy()
         if self.country in ea_countries: var_sample.drop(columns=['EXR_EUR'], inplace=True) 
         elif self.country == 'USA': var_sample.drop(columns=['EXR_USD'], inplace=True)
 
-        # Estimate VAR model 
-        varmodel = VAR(var_sample)
+        # Estimate VAR model or get cached parameters
         lag_len = 1 # if self.shock_frequency == 'annual' else 4
-        self.var = varmodel.fit(lag_len) # .fit(ic='bic')
+        self.var_params = self._fit_var(var_sample, lag_len) # 'bic' selects lag order
 
         # Extract parameters from the VAR results
-        lags = self.var.k_ar
-        intercept = self.var.params.iloc[0].values
-        coefs = self.var.coefs
-        residuals = self.var.resid.values
+        lags = self.var_params['lags']
+        intercept = self.var_params['intercept']
+        coefs = self.var_params['coefs']
+        residuals = self.var_params['residuals']
 
         # Use bootstrap sampling from the residuals or Cholesky decomposition of the covariance matrix
         if self.estimation == 'var_bootstrap':
-            residual_draws = residuals[np.random.choice(len(residuals), size=(self.N, self.draw_period), replace=True)]
+            if self._sobol():
+                uniform_draws = self._sobol_uniform((self._num_draws(), self.draw_period), seed_sequence)
+                residual_idx = np.minimum((uniform_draws * len(residuals)).astype(np.int64), len(residuals) - 1)
+            else:
+                def fill_residual_idx(generator, out):
+                    out[...] = generator.integers(len(residuals), size=out.shape)
+                residual_idx = self._draw_blocks(
+                    fill_residual_idx, np.empty((self._num_draws(), self.draw_period), dtype=np.int64), seed_sequence
+                    )
+            residual_draws = residuals[residual_idx].astype(self.dtype, copy=False)
         if self.estimation == 'var_cholesky':
-            cov_matrix = np.cov(residuals.T)
-            chol_matrix = np.linalg.cholesky(cov_matrix)
-            residual_draws = np.random.randn(self.N, self.draw_period, residuals.shape[1]) @ chol_matrix.T
+            chol_matrix = self.var_params['chol_matrix']
+            size = (self._num_draws(), self.draw_period, residuals.shape[1])
+            if self._sobol():
+                residual_draws = (self._sobol_normal(size, seed_sequence) @ chol_matrix.T).astype(self.dtype, copy=False)
+            else:
+                residual_draws = np.empty((self.N,) + size[1:], dtype=self.dtype)
+                self._draw_blocks(
+                    lambda generator, out: self._fill_correlated_normal(generator, out, chol_matrix),
+                    residual_draws[:size[0]],
+                    seed_sequence
+                    )
+        residual_draws = self._mirror_draws(residual_draws)
 
         # Set PB shocks during adjustment period to zero
         if not hasattr(self, 'stochastic_pb_adjustment'): # attribute can be set if adjustment is already included
@@ -232,8 +807,8 @@ class StochasticDsaModel(DsaModel):
         else:
             stochastic_within_adjustment = 0 # set to zero if adjustment is already included
 
-        # Simulate shocks using numba
-        self.shocks_sim_draws = np.zeros_like(residual_draws)
+        # Simulate shocks using numba, written to the columns of the VAR variables, removed exchange rate shocks stay zero
+        self.shocks_sim_draws = np.zeros((self.N, self.draw_period, self.num_variables), dtype=self.dtype)
         construct_var_shocks(
             N=self.N, 
             draw_period=self.draw_period, 
@@ -242,17 +817,10 @@ class StochasticDsaModel(DsaModel):
             intercept=intercept, 
             coefs=coefs, 
             residual_draws=residual_draws,
-            stochastic_within_adjustment=stochastic_within_adjustment
+            stochastic_within_adjustment=stochastic_within_adjustment,
+            columns=np.array([self.df_shocks.columns.get_loc(column) for column in var_sample.columns], dtype=np.int64)
             )
 
-        # Add zero exchange rate shock if it was removed before
-        if self.country in ea_countries:
-            exr_eur_shock = np.zeros((self.N, self.draw_period, 1))
-            self.shocks_sim_draws = np.concatenate((exr_eur_shock, self.shocks_sim_draws), axis=2)
-        elif self.country == 'USA':
-            exr_usd_shock = np.zeros((self.N, self.draw_period, 1))
-            self.shocks_sim_draws = np.concatenate((self.shocks_sim_draws[:,:,:1], exr_usd_shock, self.shocks_sim_draws[:,:,1:]), axis=2)
-
     def _aggregate_shocks_quarterly(self):
         """
         Aggregate quarterly shocks to annual shocks for specific variables.
@@ -260,120 +828,116 @@ class StochasticDsaModel(DsaModel):
         This method aggregates the shocks for exchange rate, short-term interest rate, nominal GDP growth, and primary balance
         from quarterly to annual shocks as the sum over four quarters. For long-term interest rate, it aggregates shocks over all past quarters up to the current year and avg_res_mat.
         """
-        # Reshape the shocks to sum over the four quarters
-        self.shocks_sim_grouped = self.shocks_sim_draws.reshape((self.N, self.stochastic_period, 4, self.num_variables))
-
-        # Try aggregating shocks for exchange rates, if not possible, set to zero
-        try:
-            exr_eur_shocks = np.sum(self.shocks_sim_grouped[:, :, :, -6], axis=2)
-        except:
-            exr_eur_shocks = np.zeros((self.N, self.stochastic_period))
-        try:
-            exr_usd_shocks = np.sum(self.shocks_sim_grouped[:, :, :, -5], axis=2)
-        except:
-            exr_usd_shocks = np.zeros((self.N, self.stochastic_period))
-
-        ## Aggregate shocks for short-term interest rate, nominal GDP growth, and primary balance
-        short_term_interest_rate_shocks = np.sum(self.shocks_sim_grouped[:, :, :, -4], axis=2)
-        nominal_gdp_growth_shocks = np.sum(self.shocks_sim_grouped[:, :, :, -2], axis=2)
-        primary_balance_shocks = np.sum(self.shocks_sim_grouped[:, :, :, -1], axis=2)
-
-        ## Aggregate shocks for long-term interest rate
-        # Calculate the average maturity in quarters 
-        maturity_quarters = int(np.round(self.avg_res_mat * 4))
-
-        # Initialize an array to store the aggregated shocks for the long-term interest rate
-        self.long_term_interest_rate_shocks = np.zeros((self.N, self.stochastic_period))
-
-        # Iterate over each year
-        for t in range(1, self.stochastic_period+1):
-            q = t * 4
-
-            # Calculate the weight for each quarter based on the current year and average residual maturity
-            weight = np.min([self.avg_res_mat, t]) / self.avg_res_mat
-
-            # Determine the number of quarters to sum based on the current year and average residual maturity
-            q_to_sum = np.min([q, maturity_quarters])
-
-            # Sum the shocks (N, T, num_quarters, num_variables) across the selected quarters
-            aggregated_shocks = weight * np.sum(
-                self.shocks_sim_draws[:, q - q_to_sum : q, -3], axis=(1)
-                )
-
-            # Assign the aggregated shocks to the corresponding year
-            self.long_term_interest_rate_shocks[:, t-1] = aggregated_shocks
-
-        # Calculate the weighted average of short and long-term interest using D_share_st
-        interest_rate_shocks = self.D_share_st * short_term_interest_rate_shocks + self.D_share_lt * self.long_term_interest_rate_shocks
-
-        # Stack all shocks in a matrix
-        self.shocks_sim = np.stack([exr_eur_shocks, exr_usd_shocks, interest_rate_shocks, nominal_gdp_growth_shocks, primary_balance_shocks], axis=2)
-        self.shocks_sim = np.transpose(self.shocks_sim, (0, 2, 1))
+        self._aggregate_shocks(periods_per_year=4, maturity_periods=int(np.round(self.avg_res_mat * 4)))
 
     def _aggregate_shocks_annual(self):
         """
         Save annual into shock matrix, aggregate long term interest rate shocks.
         """
-        # Reshape the shocks
-        self.shocks_sim_grouped = self.shocks_sim_draws.reshape((self.N, self.stochastic_period, self.num_variables))
+        self._aggregate_shocks(periods_per_year=1, maturity_periods=int(np.round(self.avg_res_mat)))
 
-        # Try retrieving shocks for exchange rates, if not possible, set to zero
-        try:
-            exr_eur_shocks = self.shocks_sim_grouped[:, :, -6]
-        except:
-            exr_eur_shocks = np.zeros((self.N, self.stochastic_period))
-        try:
-            exr_usd_shocks = self.shocks_sim_grouped[:, :, -5]
-        except:
-            exr_usd_shocks = np.zeros((self.N, self.stochastic_period))
+    def _aggregate_shocks(self, periods_per_year, maturity_periods):
+        """
+        Aggregate drawn shocks to annual shocks of shape (N, 5, stochastic_period) in one pass.
 
-        ## Retrieve shocks for short-term interest rate, nominal GDP growth, and primary balance
-        short_term_interest_rate_shocks = self.shocks_sim_grouped[:, :, -4]
-        nominal_gdp_growth_shocks = self.shocks_sim_grouped[:, :, -2]
-        primary_balance_shocks = self.shocks_sim_grouped[:, :, -1]
+        Exchange rate, short-term interest rate, nominal GDP growth, and primary balance shocks are summed over the periods 
+        of each year. Long-term interest rate shocks of year t are the sum over the last min(t, avg_res_mat) years of draws, 
+        weighted by min(avg_res_mat, t) / avg_res_mat, calculated as differences of one cumulative sum over the draw axis.
+        """
+        # Reshape the shocks and sum over the periods of each year
+        self.shocks_sim_grouped = self.shocks_sim_draws.reshape(
+            (self.N, self.stochastic_period, periods_per_year, self.num_variables)
+            )
+        annual_shocks = self.shocks_sim_grouped.sum(axis=2)
 
         ## Aggregate shocks for long-term interest rate
-        # Calculate the average maturity in years 
-        maturity_years = int(np.round(self.avg_res_mat))
-
-        # Initialize an array to store the aggregated shocks for the long-term interest rate
-        self.long_term_interest_rate_shocks = np.zeros((self.N, self.stochastic_period))
-
-        # Iterate over each year
-        for t in range(1, self.stochastic_period+1):
-            
-            # Calculate the weight for each year based on the current year and avg_res_mat
-            weight = np.min([self.avg_res_mat, t]) / self.avg_res_mat
+        # Cumulative sum of draws with leading zero, accumulated in float64 to avoid cancellation in float32
+        cumulative_shocks = np.zeros((self.N, self.draw_period + 1))
+        np.cumsum(self.shocks_sim_draws[:, :, -3], axis=1, out=cumulative_shocks[:, 1:])
+
+        # Sum over the last maturity_periods draws up to the end of each year, weighted by the maturity share
+        years = np.arange(1, self.stochastic_period + 1)
+        end_periods = years * periods_per_year
+        start_periods = np.maximum(end_periods - maturity_periods, 0)
+        weights = np.minimum(self.avg_res_mat, years) / self.avg_res_mat
+        self.long_term_interest_rate_shocks = (
+            weights * (cumulative_shocks[:, end_periods] - cumulative_shocks[:, start_periods])
+            ).astype(self.dtype, copy=False)
+
+        # Fill shock matrix, interest rate shocks are the weighted average of short and long-term shocks using D_share_st
+        self.shocks_sim = np.empty((self.N, 5, self.stochastic_period), dtype=self.dtype)
+        self.shocks_sim[:, 0] = annual_shocks[:, :, -6]
+        self.shocks_sim[:, 1] = annual_shocks[:, :, -5]
+        self.shocks_sim[:, 2] = self.D_share_st * annual_shocks[:, :, -4] + self.D_share_lt * self.long_term_interest_rate_shocks
+        self.shocks_sim[:, 3] = annual_shocks[:, :, -2]
+        self.shocks_sim[:, 4] = annual_shocks[:, :, -1]
+
+    def _fused_draws(self):
+        """
+        Check if normal shocks are drawn and aggregated in one kernel with the counter-based splitmix generator.
+        """
+        return getattr(self, 'rng', 'pseudo') == 'splitmix'
 
-            # Determine the number of years to sum based on the current year and avg_res_mat
-            t_to_sum = np.min([t, maturity_years])
+    def _draw_aggregate_shocks_fused(self, seed_sequence=None):
+        """
+        Draw normal shocks and aggregate them to annual shocks of shape (N, 5, stochastic_period) in one numba kernel.
 
-            # Sum the shocks (N, T, num_variables) across the selected years
-            aggregated_shocks = weight * np.sum(
-                self.shocks_sim_draws[:, t - t_to_sum : t, -3], axis=(1))
+        Each path draws standard normals from its own SplitMix64 stream keyed by the seed sequence and the path index,
+        correlates them with the covariance factor and sums them to annual shocks as in _aggregate_shocks. Only shocks_sim
+        is written, draws and partial sums are not stored. Since streams are fixed per path, shocks are bit-identical
+        for any number of threads, but differ from the numpy streams of the pseudo generator.
+        """
+        if seed_sequence is None:
+            seed_sequence = self._spawn_seed()
 
-            # Assign the aggregated shocks to the corresponding year
-            self.long_term_interest_rate_shocks[:, t-1] = aggregated_shocks
+        # Calculate the covariance matrix of the shock DataFrame and get its cached factor
+        self.cov_matrix = self._shock_cov_matrix()
+        factor = self._cached_cov_factor(self.cov_matrix)
 
-        # Calculate the weighted average of short and long-term interest using D_share_st
-        interest_rate_shocks = self.D_share_st * short_term_interest_rate_shocks + self.D_share_lt * self.long_term_interest_rate_shocks
+        # Number of draw periods with zero PB shocks during adjustment period
+        stochastic_within_adjustment = 0
+        if not hasattr(self, 'stochastic_pb_adjustment'): # attribute can be set if adjustment is already included
+            stochastic_within_adjustment = max(self.adjustment_end - self.stochastic_start + 1, 0)
+            if self.shock_frequency == 'quarterly': stochastic_within_adjustment *= 4
 
-        # Stack all shocks in a matrix
-        self.shocks_sim = np.stack([exr_eur_shocks, exr_usd_shocks, interest_rate_shocks, nominal_gdp_growth_shocks, primary_balance_shocks], axis=2)
-        self.shocks_sim = np.transpose(self.shocks_sim, (0, 2, 1))
+        # Long-term interest rate shocks sum over the last maturity_periods draws, weighted by the maturity share
+        periods_per_year = self.draw_period // self.stochastic_period
+        maturity_periods = int(np.round(self.avg_res_mat * periods_per_year))
+        years = np.arange(1, self.stochastic_period + 1)
+        start_periods = np.maximum(years * periods_per_year - maturity_periods, 0)
+        weights = np.minimum(self.avg_res_mat, years) / self.avg_res_mat
+
+        self.shocks_sim = np.empty((self.N, 5, self.stochastic_period), dtype=self.dtype)
+        draw_aggregate_shocks_jit(
+            N=self.N,
+            num_draws=self._num_draws(),
+            key=seed_sequence.generate_state(1, dtype=np.uint64)[0],
+            factor=np.ascontiguousarray(factor, dtype=np.float64),
+            periods_per_year=periods_per_year,
+            stochastic_within_adjustment=stochastic_within_adjustment,
+            start_periods=start_periods,
+            weights=weights,
+            D_share_st=self.D_share_st,
+            D_share_lt=self.D_share_lt,
+            shocks_sim=self.shocks_sim
+            )
 
     def _combine_shocks_baseline(self):
         """
         Combine shocks with the respective baseline variables and set starting values for simulation.
         """
+        # New paths invalidate sorted columns and percentiles
+        self._sorted_sim_cache = {}
+        self._percentile_cache = {}
+
         # Create arrays to store the simulated variables
-        d_sim = np.zeros([self.N, self.stochastic_period+1])  # Debt to GDP ratio
-        exr_eur_sim = np.zeros([self.N, self.stochastic_period+1])  # EUR exchange rate
-        exr_usd_sim = np.zeros([self.N, self.stochastic_period+1])  # USD exchange rate
-        iir_sim = np.zeros([self.N, self.stochastic_period+1])  # Implicit interest rate
-        ng_sim = np.zeros([self.N, self.stochastic_period+1])  # Nominal GDP growth
-        pb_sim = np.zeros([self.N, self.stochastic_period+1])  # Primary balance
-        sf_sim = np.zeros([self.N, self.stochastic_period+1])  # Stock flow adjustment
+        d_sim = np.zeros([self.N, self.stochastic_period+1], dtype=self.dtype)  # Debt to GDP ratio
+        exr_eur_sim = np.zeros([self.N, self.stochastic_period+1], dtype=self.dtype)  # EUR exchange rate
+        exr_usd_sim = np.zeros([self.N, self.stochastic_period+1], dtype=self.dtype)  # USD exchange rate
+        iir_sim = np.zeros([self.N, self.stochastic_period+1], dtype=self.dtype)  # Implicit interest rate
+        ng_sim = np.zeros([self.N, self.stochastic_period+1], dtype=self.dtype)  # Nominal GDP growth
+        pb_sim = np.zeros([self.N, self.stochastic_period+1], dtype=self.dtype)  # Primary balance
+        sf_sim = np.zeros([self.N, self.stochastic_period+1], dtype=self.dtype)  # Stock flow adjustment
 
         # Call the Numba JIT function with converted self variables
         combine_shocks_baseline_jit(
@@ -426,7 +990,222 @@ class StochasticDsaModel(DsaModel):
             sf_sim=self.sf_sim)
 
         # Set negative debt-to-GDP ratios to zero
-        self.d_sim = np.where(self.d_sim < 0, 0, self.d_sim)
+        self.d_sim[self.d_sim < 0] = 0
+        self._sorted_sim_cache = {}
+        self._percentile_cache = {}
+
+    def _simulate_debt_criteria(self):
+        """
+        Simulate the debt-to-GDP ratio and calculate the probabilities of the stochastic criteria without storing paths.
+        """
+        if self._chunked():
+            return self._simulate_debt_criteria_chunked()
+        count_below_60, d_columns = self._debt_criteria_columns(self.N)
+
+        # Calculate probabilities from the stored columns
+        if 'debt_declines' in self.stochastic_criteria:
+            self.prob_declines = prob_debt_declines_columns_jit(N=self.N, d_start=d_columns[:, 0], d_end=d_columns[:, 2])
+        if 'debt_stable' in self.stochastic_criteria:
+            self.prob_stable = self._prob_debt_stable_sorted(np.sort(d_columns[:, 1]), np.sort(d_columns[:, 2]))
+        if 'debt_below_60' in self.stochastic_criteria:
+            self.prob_below_60 = count_below_60 / self.N
+
+        # Apply control variate and report variance reduction
+        if getattr(self, 'control_variate', False) or getattr(self, 'antithetic', False):
+            self._reduce_variance(d_columns)
+
+    def _reduce_variance(self, d_columns):
+        """
+        Re-estimate the debt declines and debt below 60 probabilities with antithetic pairs and the control variate. 
+        The control variate is the same criterion evaluated on the debt recursion linearized around zero shocks, whose 
+        probability is known in closed form for normally distributed shocks. Variance reduction factors relative to 
+        plain Monte Carlo are saved in variance_reduction.
+        """
+        thresholds = {}
+        if 'debt_declines' in self.stochastic_criteria:
+            thresholds['prob_declines'] = mean_jit(d_columns[:, 0])
+        if 'debt_below_60' in self.stochastic_criteria:
+            thresholds['prob_below_60'] = 60
+
+        # Linearized debt at end of stochastic period, closed form only for normal shocks
+        use_control = getattr(self, 'control_variate', False) and self.estimation == 'normal'
+        if use_control:
+            d_linear, d_linear_mean, d_linear_sd = self._linearized_debt_end()
+            use_control = d_linear_sd > 0
+
+        self.variance_reduction = {}
+        for prob, threshold in thresholds.items():
+            x = (d_columns[:, 2] <= threshold).astype(np.float64)
+            if use_control:
+                y = (d_linear <= threshold).astype(np.float64)
+                y_mean = norm.cdf((threshold - d_linear_mean) / d_linear_sd)
+            else:
+                y, y_mean = None, None
+            estimate, reduction = self._variance_reduced_estimate(x, y, y_mean)
+            setattr(self, prob, estimate)
+            self.variance_reduction[prob] = reduction
+
+    def _variance_reduced_estimate(self, x, y=None, y_mean=None):
+        """
+        Return mean of path indicators x, adjusted with control variate y of known mean y_mean, and the variance reduction
+        factor relative to plain Monte Carlo with independent paths. Antithetic pairs are averaged before estimating variances.
+        """
+        # Average antithetic pairs, unpaired paths are kept as they are
+        if getattr(self, 'antithetic', False):
+            half = self.N // 2
+            M = self.N - half
+            x_units = np.concatenate([(x[:half] + x[M:]) / 2, x[half:M]])
+            y_units = np.concatenate([(y[:half] + y[M:]) / 2, y[half:M]]) if y is not None else None
+        else:
+            x_units, y_units = x, y
+
+        # Control variate coefficient from sample covariance
+        estimate = np.mean(x)
+        residual = x_units
+        if y is not None and np.var(y_units) > 0:
+            beta = np.cov(x_units, y_units)[0, 1] / np.var(y_units, ddof=1)
+            estimate = np.clip(estimate - beta * (np.mean(y) - y_mean), 0, 1)
+            residual = x_units - beta * y_units
+
+        # Variance of estimate relative to plain Monte Carlo
+        variance_plain = np.mean(x) * (1 - np.mean(x)) / self.N
+        variance = np.var(residual, ddof=1) / len(residual)
+        reduction = variance_plain / variance if variance > 0 else np.nan
+        return estimate, reduction
+
+    def _linearized_debt_end(self, eps=1e-4):
+        """
+        Linearize simulated debt at the end of the stochastic period around zero shocks. Returns the linearized debt of each
+        path, debt without shocks, and the standard deviation of linearized debt implied by the shock covariance matrix.
+        """
+        # Gradient of end-of-period debt with respect to annual shocks from central differences
+        num_shocks = 5 * self.stochastic_period
+        shocks = np.zeros((2 * num_shocks + 1, 5, self.stochastic_period))
+        for k in range(num_shocks):
+            shocks[1 + k].flat[k] = eps
+            shocks[1 + num_shocks + k].flat[k] = -eps
+        _, d_columns = self._debt_criteria_columns(shocks.shape[0], shocks_sim=shocks)
+        d_end = d_columns[:, 2]
+        gradient = ((d_end[1:num_shocks + 1] - d_end[num_shocks + 1:]) / (2 * eps)).reshape(5, self.stochastic_period)
+
+        # Linearized debt of each path
+        d_linear_mean = d_end[0]
+        d_linear = d_linear_mean + np.tensordot(self.shocks_sim, gradient, axes=([1, 2], [0, 1]))
+
+        # Weights of drawn shocks on linearized debt, draws are independent over periods
+        weights = np.tensordot(self._aggregated_shock_basis(), gradient, axes=([1, 2], [0, 1]))
+        weights = weights.reshape(self.draw_period, self.num_variables)
+        d_linear_sd = np.sqrt(np.einsum('qi,ij,qj->', weights, np.asarray(self.cov_matrix), weights))
+
+        return d_linear, d_linear_mean, d_linear_sd
+
+    def _aggregated_shock_basis(self):
+        """
+        Aggregate unit draws of each period and variable to annual shocks, giving the linear map from draws to shocks_sim.
+        """
+        num_draws = self.draw_period * self.num_variables
+        basis = np.eye(num_draws).reshape(num_draws, self.draw_period, self.num_variables)
+
+        # Set PB shocks during adjustment period to zero
+        if not hasattr(self, 'stochastic_pb_adjustment'):
+            stochastic_within_adjustment = self.adjustment_end - self.stochastic_start + 1
+            if self.shock_frequency == 'quarterly': stochastic_within_adjustment *= 4
+            if stochastic_within_adjustment > 0:
+                basis[:, :stochastic_within_adjustment, -1] = 0
+
+        # Aggregate basis draws, keep simulated shocks, draws are missing with fused or stored shocks
+        variables = ['N', 'shocks_sim_draws', 'shocks_sim', 'shocks_sim_grouped', 'long_term_interest_rate_shocks']
+        saved = {var: getattr(self, var) for var in variables if hasattr(self, var)}
+        try:
+            self.N = num_draws
+            self.shocks_sim_draws = basis
+            if self.shock_frequency == 'quarterly':
+                self._aggregate_shocks_quarterly()
+            elif self.shock_frequency == 'annual':
+                self._aggregate_shocks_annual()
+            shock_basis = np.asarray(self.shocks_sim, dtype=np.float64)
+        finally:
+            for var in variables:
+                if var in saved:
+                    setattr(self, var, saved[var])
+                elif hasattr(self, var):
+                    delattr(self, var)
+        return shock_basis
+
+    def _simulate_debt_criteria_chunked(self):
+        """
+        Calculate the probabilities of the stochastic criteria chunk by chunk. Counts are exact, the debt stable criterion 
+        compares quantiles from histogram sketches. If debt at criterion start differs between paths, the chunks are 
+        simulated a second time to count declining paths against the mean over all paths. Antithetic pairs are drawn 
+        within chunks, but neither the antithetic estimator nor the control variate is applied.
+        """
+        self.variance_reduction = {}
+
+        count_below_60 = 0
+        count_declines = 0
+        d_start_sum = 0.0
+        d_start_constant = self.stochastic_criterion_start == 0
+        sketch_stable = None
+        for i in range(self._num_chunks()):
+            chunk_N = self._draw_chunk(i)
+            chunk_below_60, d_columns = self._debt_criteria_columns(chunk_N)
+            count_below_60 += chunk_below_60
+            d_start_sum += d_columns[:, 0].sum()
+            if d_start_constant:
+                count_declines += int(np.sum(d_columns[0, 0] >= d_columns[:, 2]))
+            if 'debt_stable' in self.stochastic_criteria:
+                if sketch_stable is None:
+                    sketch_stable = HistogramSketch.from_sample(d_columns[:, 1:])
+                sketch_stable.update(d_columns[:, 1:])
+
+        # Second pass for debt decline if mean at criterion start is only known after first pass
+        if 'debt_declines' in self.stochastic_criteria and not d_start_constant:
+            d_start_mean = d_start_sum / self.N
+            for i in range(self._num_chunks()):
+                chunk_N = self._draw_chunk(i)
+                _, d_columns = self._debt_criteria_columns(chunk_N)
+                count_declines += int(np.sum(d_start_mean >= d_columns[:, 2]))
+
+        if 'debt_declines' in self.stochastic_criteria:
+            self.prob_declines = count_declines / self.N
+        if 'debt_stable' in self.stochastic_criteria:
+            num_quantiles = getattr(self, 'debt_stable_quantiles', 10000)
+            quantiles = sketch_stable.quantile(np.arange(num_quantiles) / num_quantiles)
+            self.prob_stable = np.mean(quantiles[:, 0] >= quantiles[:, 1])
+        if 'debt_below_60' in self.stochastic_criteria:
+            self.prob_below_60 = count_below_60 / self.N
+
+    def _debt_criteria_columns(self, N, shocks_sim=None):
+        """
+        Simulate debt for the first N paths of shocks_sim, return number of paths below 60 and debt at criterion columns.
+        """
+        if shocks_sim is None:
+            shocks_sim = self.shocks_sim
+        # Columns of the debt paths needed for the criteria: criterion start, fifth-to-last and last year
+        columns = np.array([self.stochastic_criterion_start, self.stochastic_period - 4, self.stochastic_period])
+        d_columns = np.empty((N, 3), dtype=np.float64)
+        self._set_num_threads()
+
+        # Call the Numba JIT function with converted self variables
+        count_below_60 = simulate_debt_criteria_jit(
+            N=N, 
+            stochastic_start=self.stochastic_start,
+            stochastic_period=self.stochastic_period, 
+            D_share_domestic=self.D_share_domestic,
+            D_share_eur=self.D_share_eur, 
+            D_share_usd=self.D_share_usd,
+            shocks_sim=shocks_sim, 
+            exr_eur=self.exr_eur, 
+            exr_usd=self.exr_usd,
+            iir=self.iir, 
+            ng=self.ng, 
+            pb=self.pb, 
+            sf=self.sf, 
+            d=self.d, 
+            columns=columns,
+            d_columns=d_columns
+            )
+        return count_below_60, d_columns
 
 # ========================================================================================= #
 #                                AUXILIARY METHODS                                          #
@@ -437,18 +1216,12 @@ class StochasticDsaModel(DsaModel):
         Create a fanchart for the debt-to-GDP ratio or other variables. Saves data as df and plots if specified.
         """
         # Set stochastic variable
-        sim_var = getattr(self, f'{var}_sim')
         bl_var = getattr(self, f'{var}')
 
-        # Check if first values of baseline and simulation are equal, if not, simulate
-        if not np.isclose(sim_var[0, 0], bl_var[self.stochastic_start-1]): 
-            self.simulate()
-            sim_var = getattr(self, f'{var}_sim')
-
-        # Calculate the percentiles
-        self.pcts_dict = {}
-        for pct in np.arange(10, 100, 10):
-            self.pcts_dict[pct] = np.percentile(sim_var, pct, axis=0)[:self.stochastic_period+1]
+        # Calculate the (9, stochastic_period+1) array of deciles in one pass
+        pcts = np.arange(10, 100, 10)
+        pcts_array = self.sim_percentiles(var, pcts)
+        self.pcts_dict = {pct: pcts_array[i] for i, pct in enumerate(pcts)}
 
         # Create array of years and baseline debt-to-GDP ratio
         years = np.arange(self.start_year, self.end_year+1)
@@ -485,12 +1258,68 @@ class StochasticDsaModel(DsaModel):
         if save_plot:
             plt.savefig(save_as, dpi=300, bbox_inches='tight')
 
-        # Save fanchart data in a dataframe
-        self.df_fanchart = pd.DataFrame({'year': years, 'baseline': bl_var})
-        for pct in self.pcts_dict:
-            df_pct = pd.DataFrame({'year': years[self.stochastic_start-1:self.stochastic_end+1], f'p{pct}': 
-            self.pcts_dict[pct]})
-            self.df_fanchart = self.df_fanchart.merge(df_pct, on='year', how='left')
+        # Save fanchart data in a dataframe, percentiles are NaN outside the stochastic period
+        pcts_full = np.full((len(pcts), len(years)), np.nan)
+        pcts_full[:, self.stochastic_start-1:self.stochastic_end+1] = pcts_array
+        self.df_fanchart = pd.DataFrame(
+            {'year': years, 'baseline': bl_var, **{f'p{pct}': pcts_full[i] for i, pct in enumerate(pcts)}}
+            )
+        self._retain_summary()
+
+    def sim_percentiles(self, var='d', pcts=np.arange(10, 100, 10)):
+        """
+        Return array of shape (len(pcts), stochastic_period+1) with percentiles of a simulated variable in each year. 
+        Uses the sorted column cache, shared with the debt stable criterion, or histogram sketches in chunked mode. 
+        Simulates first if the simulation does not start from the current baseline. Percentiles are memoized until 
+        paths are simulated again, so they remain available after buffers are released in summary retention mode.
+        """
+        bl_start = getattr(self, f'{var}')[self.stochastic_start-1]
+
+        # Return memoized percentiles if simulation starts from current baseline
+        key = (var, tuple(np.asarray(pcts).tolist()))
+        if not hasattr(self, '_percentile_cache'):
+            self._percentile_cache = {}
+        if key in self._percentile_cache and np.isclose(self._percentile_cache[key][0, 0], bl_start):
+            return self._percentile_cache[key]
+
+        # Calculate the percentiles from histogram sketches in chunked mode
+        if self._chunked():
+            if not hasattr(self, 'sim_sketches') or not np.isclose(self.sim_sketches[var].min[0], bl_start):
+                self.simulate()
+            pcts_array = self.sim_sketches[var].quantile(np.asarray(pcts) / 100)[:, :self.stochastic_period+1]
+
+        # Check if first values of baseline and simulation are equal, if not, simulate
+        else:
+            if not hasattr(self, f'{var}_sim') or not np.isclose(getattr(self, f'{var}_sim')[0, 0], bl_start): 
+                self.simulate()
+            pcts_array = np.stack(
+                [self._sorted_percentiles(self._sorted_sim_column(var, t), pcts) for t in range(self.stochastic_period+1)], 
+                axis=1
+                )
+        self._percentile_cache[key] = pcts_array
+        return pcts_array
+
+    def _retain_summary(self):
+        """
+        In summary retention mode, memoize debt fanchart percentiles of current paths and release simulated shocks and paths.
+        """
+        if getattr(self, 'keep', 'all') != 'summary':
+            return
+        if hasattr(self, 'd_sim') and np.isclose(self.d_sim[0, 0], self.d[self.stochastic_start-1]):
+            self.sim_percentiles('d')
+        for var in self._simulation_buffers:
+            if hasattr(self, var):
+                delattr(self, var)
+
+    def __getstate__(self):
+        """
+        Drop simulated shocks and paths when pickling in summary retention mode, e.g. for worker processes.
+        """
+        state = self.__dict__.copy()
+        if state.get('keep', 'all') == 'summary':
+            for var in self._simulation_buffers:
+                state.pop(var, None)
+        return state
 
     def plot_shocks(self, hist=False, percentiles=False, sim=False, figsize=(15, 10)):
         """
@@ -499,6 +1328,15 @@ class StochasticDsaModel(DsaModel):
         adds quantile lines: vertical for histograms and horizontal for line plots (time-series 
         percentiles for simulation data).
         """
+        assert not (sim and self._fused_draws()), 'Simulated draws are not stored with the splitmix generator'
+        
+        # Redraw draws of stored or released shocks from the stream of the current simulation
+        if sim and not hasattr(self, 'shocks_sim_draws'):
+            assert hasattr(self, '_simulation_seed') and not self._chunked(), 'Simulate all paths before plotting draws'
+            if self.estimation == 'normal':
+                self._draw_shocks_normal(self._simulation_seed)
+            else:
+                self._draw_shocks_var(self._simulation_seed)
         if not hasattr(self, 'prob_target'):
             self.prob_target = 0.7
 
@@ -550,15 +1388,70 @@ class StochasticDsaModel(DsaModel):
 # ========================================================================================= #
 
     def find_spb_stochastic(self, 
-                            bounds=(-5, 5), 
+                            bounds=None, 
                             stochastic_criteria=['debt_declines', 'debt_below_60'],
                             stochastic_criterion_start_year=None,
                             print_update=False,
-                            prob_target=None):
+                            prob_target=None,
+                            redraw_shocks=True,
+                            confidence=None):
         """
         Find the structural primary balance that ensures the probability of the debt-to-GDP ratio exploding is equal to prob_target.
+        If redraw_shocks is False, the shocks of the previous simulation are reused.
+        If no bounds are given, the optimizer starts from the analytic bracket within (-5, 5).
+        If se_tolerance or spb_tolerance is set, paths are added until the target is precise enough, see precision.
+        If confidence is set, e.g. 0.95, returns the target and its batch-means Monte Carlo confidence interval.
         """
         # Set parameters
+        self._set_stochastic_parameters(stochastic_criteria, stochastic_criterion_start_year, print_update, prob_target)
+        
+        self.stochastic_optimization_dict = {}
+
+        # Initial projection
+        self.project(
+            edp_steps=self.edp_steps,
+            deficit_resilience_steps=self.deficit_resilience_steps,
+            post_spb_steps=self.post_spb_steps,
+            scenario=None
+            )
+        
+        # Optimize for both debt decline and debt remaining under 60 and choose the lower SPB
+        if self._adaptive():
+            self.spb_target = self._adaptive_optimization(bounds=bounds, redraw_shocks=redraw_shocks)
+        else:
+            self.spb_target = self._stochastic_optimization(bounds=bounds, redraw_shocks=redraw_shocks)
+
+        # Monte Carlo uncertainty of target from blocks of the same simulation
+        if confidence is not None:
+            self.precision = self._target_precision(self.spb_target, confidence=confidence, num_blocks=self.ci_blocks)
+
+        # Project with optimal spb and store simulated paths at optimum
+        self.project(
+            spb_target=self.spb_target, 
+            edp_steps=self.edp_steps,
+            deficit_resilience_steps=self.deficit_resilience_steps,
+            post_spb_steps=self.post_spb_steps,
+            scenario=None
+            )
+        if self._chunked():
+            self._simulate_path_sketches()
+        else:
+            self._combine_shocks_baseline()
+            self._simulate_debt()
+        self._retain_summary()
+
+        if confidence is not None:
+            return self.spb_target, self.precision['spb_batch_ci']
+        return self.spb_target
+    
+    def _set_stochastic_parameters(self, 
+                                   stochastic_criteria=['debt_declines', 'debt_below_60'],
+                                   stochastic_criterion_start_year=None,
+                                   print_update=False,
+                                   prob_target=None):
+        """
+        Set parameters of stochastic optimization, keep attributes set by user.
+        """
         self.print_update = print_update
         
         if not hasattr(self, 'stochastic_criteria'):
@@ -583,53 +1476,204 @@ class StochasticDsaModel(DsaModel):
             self.stochastic_criterion_start = 0
         else:
             self.stochastic_criterion_start = stochastic_criterion_start_year - self.stochastic_start_year  
-        
-        self.stochastic_optimization_dict = {}
-
-        # Initial projection
-        self.project(
-            edp_steps=self.edp_steps,
-            deficit_resilience_steps=self.deficit_resilience_steps,
-            post_spb_steps=self.post_spb_steps,
-            scenario=None
-            )
-        
-        # Optimize for both debt decline and debt remaining under 60 and choose the lower SPB
-        self.spb_target = self._stochastic_optimization(bounds=bounds)
 
-        # Project with optimal spb
-        self.project(
-            spb_target=self.spb_target, 
-            edp_steps=self.edp_steps,
-            deficit_resilience_steps=self.deficit_resilience_steps,
-            post_spb_steps=self.post_spb_steps,
-            scenario=None
-            )
+    def _stochastic_condition_at(self, spb_target):
+        """
+        Checks if stochastic criteria are met at given SPB target using a single simulation.
+        """
+        self._set_stochastic_parameters()
+        self.simulate()
+        self.stochastic_optimization_dict = {}
+        self._stochastic_target(spb_target)
+        return self._max_prob() > self.prob_target
 
-        return self.spb_target
-    
-    def _stochastic_optimization(self, bounds):
+    def _stochastic_optimization(self, bounds, redraw_shocks=True):
         """
         Optimizes for SPB that ensures debt remains below 60% with probability prob_target.
         """
-        # Initital simulation
-        self.simulate()
+        # Initital simulation, shocks are redrawn if they were released
+        if redraw_shocks or (not self._chunked() and not hasattr(self, 'shocks_sim')):
+            self.simulate()
 
-        # Set parameters
-        self.spb_bounds = bounds
+        # Set parameters, seed bounds with analytic bracket if no bounds given
+        default_bounds = (-5, 5)
+        self.spb_bounds = bounds if bounds is not None else self.spb_target_bracket(
+            criterion='stochastic', bounds=default_bounds, margin=2
+            )
         self.stochastic_optimization_dict = {}
 
         # Optimize _target_pb to find b_target that ensures prob_debt_below_60 or prob_debt_declines == prob_target
         self.spb_target = minimize_scalar(self._stochastic_target, method='bounded', bounds=self.spb_bounds).x
+
+        # If optimum is at edge of analytic bracket, repeat with default bounds
+        if bounds is None and self._at_bracket_edge(self.spb_target, self.spb_bounds, default_bounds):
+            self.spb_bounds = default_bounds
+            self.spb_target = minimize_scalar(self._stochastic_target, method='bounded', bounds=self.spb_bounds).x
         
         # Store results in a dataframe
         self.df_stochastic_optimization = pd.DataFrame(self.stochastic_optimization_dict).T
         
         return self.spb_target
 
-    def _stochastic_target(self, spb_target):
+    @staticmethod
+    def _at_bracket_edge(spb_target, bracket, bounds, tol=1e-3):
         """
-        Returns zero if primary balance ensures prop_debt_declines == prob_target or prob_debt_below_60 == prob_target.
+        Check if optimum lies at an edge of the bracket that is not an edge of the outer bounds.
+        """
+        at_lower = spb_target - bracket[0] < tol and bracket[0] > bounds[0]
+        at_upper = bracket[1] - spb_target < tol and bracket[1] < bounds[1]
+        return at_lower or at_upper
+
+    def _adaptive(self):
+        """
+        Check if paths are added until a precision target is met.
+        """
+        return getattr(self, 'se_tolerance', None) is not None or getattr(self, 'spb_tolerance', None) is not None
+
+    def _adaptive_optimization(self, bounds, redraw_shocks=True):
+        """
+        Optimize the SPB target and add batches of paths until the standard error of the active criterion probability 
+        is below se_tolerance and the implied standard error of the SPB target is below spb_tolerance, or adaptive_max_N 
+        is reached. The number of batches added is projected from the current standard errors, which fall with the 
+        square root of N. The precision at the final target is saved in precision.
+        """
+        batch_size = self.N
+        spb_target = self._stochastic_optimization(bounds=bounds, redraw_shocks=redraw_shocks)
+        while True:
+            self.precision = self._target_precision(spb_target)
+            ratio = 0
+            if self.se_tolerance is not None:
+                ratio = max(ratio, self.precision['prob_se'] / self.se_tolerance)
+            if self.spb_tolerance is not None:
+                ratio = max(ratio, self.precision['spb_se'] / self.spb_tolerance)
+            if ratio <= 1 or self.N >= self.adaptive_max_N:
+                break
+
+            # Redraw with more paths from the same stream and reoptimize
+            num_batches = int(np.ceil(min(ratio**2 * self.N, self.adaptive_max_N) / batch_size)) - self.N // batch_size
+            self._extend_simulation(min(self.N + max(num_batches, 1) * batch_size, self.adaptive_max_N))
+            if self.print_update:
+                print(f'prob_se: {self.precision["prob_se"]:.4f}, spb_se: {self.precision["spb_se"]:.4f}, N: {self.N}')
+            spb_target = self._stochastic_optimization(bounds=bounds, redraw_shocks=False)
+
+        return spb_target
+
+    def _extend_simulation(self, N):
+        """
+        Increase the number of paths to N. Shocks are redrawn from the stream of the current simulation, so existing 
+        streams are extended rather than replaced, and antithetic pairs stay aligned.
+        """
+        self.N = N
+        self._round_sobol_paths()
+        if not self._chunked():
+            self._draw_aggregate_shocks(self._simulation_seed)
+
+    def _target_precision(self, spb_target, step=0.1, confidence=0.95, num_blocks=None):
+        """
+        Return number of paths, active criterion probability, its standard error and confidence interval at the SPB 
+        target, and the implied standard error and confidence interval of the SPB target. The SPB standard error is the 
+        probability standard error divided by the slope of the probability, estimated by central differences with the 
+        same shocks. Probability standard errors account for the variance reduction of antithetic draws and control variates.
+        If num_blocks is set, also returns the batch-means standard error and confidence interval of the SPB target.
+        If the probability is flat around the target, the step is doubled up to max_slope_step. If it is still flat and 
+        noisy, a warning is issued and the SPB standard errors are infinite.
+        """
+        self._simulate_criteria_at(spb_target)
+        criterion = self._active_criterion()
+        prob = getattr(self, criterion)
+        reduction = getattr(self, 'variance_reduction', {}).get(criterion, np.nan)
+        prob_se = np.sqrt(prob * (1 - prob) / self.N / (reduction if reduction > 0 else 1))
+        if num_blocks is not None:
+            block_probs = self._block_probabilities(num_blocks)
+
+        # Slope of active criterion probability around target, widen step while criterion is flat
+        while True:
+            slope = 0
+            block_slopes = 0
+            for sign in [1, -1]:
+                self._simulate_criteria_at(spb_target + sign * step)
+                slope += sign * getattr(self, criterion) / (2 * step)
+                if num_blocks is not None:
+                    block_slopes = block_slopes + sign * self._block_probabilities(num_blocks) / (2 * step)
+            flat = slope == 0 or (num_blocks is not None and np.mean(block_slopes) == 0)
+            if not flat or step * 2 > self.max_slope_step:
+                break
+            step *= 2
+        self.spb_target = spb_target # projection sets target
+        if prob_se == 0:
+            spb_se = 0
+        else:
+            spb_se = prob_se / np.abs(slope) if slope != 0 else np.inf
+
+        z = norm.ppf(0.5 + confidence / 2)
+        precision = {
+            'N': self.N,
+            'criterion': criterion,
+            'prob': prob,
+            'prob_se': prob_se,
+            'prob_ci': (max(prob - z * prob_se, 0), min(prob + z * prob_se, 1)),
+            'spb_se': spb_se,
+            'spb_ci': (spb_target - z * spb_se, spb_target + z * spb_se),
+            'slope_step': step,
+            }
+
+        # Batch means of block targets, each one Newton step from the target with the mean block slope
+        if num_blocks is not None:
+            block_slope = np.mean(block_slopes)
+            if block_slope != 0:
+                block_targets = spb_target + (self.prob_target - block_probs) / block_slope
+                spb_batch_se = np.std(block_targets, ddof=1) / np.sqrt(num_blocks)
+            else:
+                spb_batch_se = 0 if np.ptp(block_probs) == 0 else np.inf
+            t = t_dist.ppf(0.5 + confidence / 2, num_blocks - 1)
+            precision['num_blocks'] = num_blocks
+            precision['spb_batch_se'] = spb_batch_se
+            precision['spb_batch_ci'] = (spb_target - t * spb_batch_se, spb_target + t * spb_batch_se)
+
+        # Warn if criterion is flat but noisy, confidence intervals of the SPB target are unbounded
+        if np.isinf(spb_se) or np.isinf(precision.get('spb_batch_se', 0)):
+            warnings.warn(
+                f'{criterion} is flat within {step} of the SPB target {spb_target}, SPB confidence interval is unbounded'
+                )
+        return precision
+
+    def _block_probabilities(self, num_blocks):
+        """
+        Return the probability of the more probable stochastic criterion in each of num_blocks blocks of paths at the 
+        current projection. Blocks are independent, antithetic pairs are in the same block and each chunk contributes 
+        equally to all blocks. Probabilities are plain Monte Carlo estimates without control variate. In chunked mode, 
+        the three debt columns of all paths are kept, 24 bytes per path.
+        """
+        # Debt at criterion columns and block of each path
+        d_columns = np.empty((self.N, 3))
+        blocks = np.empty(self.N, dtype=np.int64)
+        N = self.N
+        chunk_size = self.chunk_size if self._chunked() else N
+        for i in range(-(-N // chunk_size)):
+            start = i * chunk_size
+            chunk_N = self._draw_chunk(i) if self._chunked() else N
+            _, d_columns[start:start + chunk_N] = self._debt_criteria_columns(chunk_N)
+            num_draws = -(-chunk_N // 2) if getattr(self, 'antithetic', False) else chunk_N
+            blocks[start:start + chunk_N] = np.arange(chunk_N) % num_draws * num_blocks // num_draws
+        block_sizes = np.bincount(blocks, minlength=num_blocks)
+
+        # Probability of each criterion in each block, mean debt at criterion start is taken over all paths
+        probs = []
+        if 'debt_declines' in self.stochastic_criteria:
+            declines = d_columns[:, 2] <= mean_jit(d_columns[:, 0])
+            probs.append(np.bincount(blocks, weights=declines, minlength=num_blocks) / block_sizes)
+        if 'debt_stable' in self.stochastic_criteria:
+            probs.append(np.array([
+                self._prob_debt_stable_sorted(np.sort(d_columns[blocks == b, 1]), np.sort(d_columns[blocks == b, 2]))
+                for b in range(num_blocks)
+                ]))
+        if 'debt_below_60' in self.stochastic_criteria:
+            probs.append(np.bincount(blocks, weights=d_columns[:, 2] <= 60, minlength=num_blocks) / block_sizes)
+        return np.max(probs, axis=0)
+
+    def _simulate_criteria_at(self, spb_target):
+        """
+        Project with the given SPB target and calculate the probabilities of the stochastic criteria.
         """
         # Simulate the debt-to-GDP ratio with the given primary balance target
         self.project(
@@ -640,41 +1684,31 @@ class StochasticDsaModel(DsaModel):
             scenario=None
             )
 
-        # Combine shocks with new baseline
-        self._combine_shocks_baseline()
-
         # Simulate debt ratio and calculate probability of debt exploding or exceeding 60
-        self._simulate_debt()
+        self._simulate_debt_criteria()
+
+    def _stochastic_target(self, spb_target):
+        """
+        Returns zero if primary balance ensures prop_debt_declines == prob_target or prob_debt_below_60 == prob_target.
+        """
+        self._simulate_criteria_at(spb_target)
+
         self.stochastic_optimization_dict[spb_target] = {}
         print_msg = f'spb: {spb_target:.2f}'
         if 'debt_declines' in self.stochastic_criteria:
-            self.prob_debt_declines()
             self.stochastic_optimization_dict[spb_target]['prob_debt_declines'] = self.prob_declines
             print_msg += f', prob_debt_declines: {self.prob_declines:.2f}'
         if 'debt_stable' in self.stochastic_criteria:
-            self.prob_debt_stable()
             self.stochastic_optimization_dict[spb_target]['prob_debt_stable'] = self.prob_stable
             print_msg += f', prob_debt_stable: {self.prob_stable:.2f}'
         if 'debt_below_60' in self.stochastic_criteria:
-            self.prob_debt_below_60()
             self.stochastic_optimization_dict[spb_target]['prob_debt_below_60'] = self.prob_below_60
             print_msg += f', prob_debt_below_60: {self.prob_below_60:.2f}'
         if self.print_update:
             print(print_msg, end='\r')
 
         # Optimize for more probable target    
-        if 'debt_declines' in self.stochastic_criteria and 'debt_below_60' in self.stochastic_criteria:
-            max_prob = np.max([self.prob_declines, self.prob_below_60])
-        elif 'debt_stable' in self.stochastic_criteria and 'debt_below_60' in self.stochastic_criteria:
-            max_prob = np.max([self.debt_stable, self.prob_below_60])
-        elif 'debt_declines' in self.stochastic_criteria:
-            max_prob = self.prob_declines
-        elif 'debt_stable' in self.stochastic_criteria:
-            max_prob = self.prob_stable
-        elif 'debt_below_60' in self.stochastic_criteria:
-            max_prob = self.prob_below_60
-        else:
-            raise ValueError('Unknown stochastic criteria or combination!')        
+        max_prob = self._max_prob()
         
         # Penalty term to avoid local minima at probability bounds
         if (np.isclose(max_prob, 0)) or (np.isclose(max_prob, 1)):
@@ -684,6 +1718,30 @@ class StochasticDsaModel(DsaModel):
         
         return np.abs(max_prob - self.prob_target) + penalty
 
+    def _active_criterion(self):
+        """
+        Returns the probability attribute of the more probable stochastic criterion.
+        """
+        probs = {'debt_declines': 'prob_declines', 'debt_stable': 'prob_stable', 'debt_below_60': 'prob_below_60'}
+        return max([probs[criterion] for criterion in self.stochastic_criteria if criterion in probs], key=lambda prob: getattr(self, prob))
+
+    def _max_prob(self):
+        """
+        Returns the probability of the more probable stochastic criterion.
+        """
+        if 'debt_declines' in self.stochastic_criteria and 'debt_below_60' in self.stochastic_criteria:
+            return np.max([self.prob_declines, self.prob_below_60])
+        elif 'debt_stable' in self.stochastic_criteria and 'debt_below_60' in self.stochastic_criteria:
+            return np.max([self.prob_stable, self.prob_below_60])
+        elif 'debt_declines' in self.stochastic_criteria:
+            return self.prob_declines
+        elif 'debt_stable' in self.stochastic_criteria:
+            return self.prob_stable
+        elif 'debt_below_60' in self.stochastic_criteria:
+            return self.prob_below_60
+        else:
+            raise ValueError('Unknown stochastic criteria or combination!')        
+
     def prob_debt_declines(self):
         """
         Calculate the probability of the debt-to-GDP ratio exploding.
@@ -700,12 +1758,44 @@ class StochasticDsaModel(DsaModel):
         """
         Calculate the probability of the debt-to-GDP ratio stabalizing by end of projection.
         """
-        # Call the Numba JIT function with converted self variables
-        self.prob_stable = prob_debt_stable_jit(
-            N=self.N, 
-            d_sim=self.d_sim
-            )
+        self.prob_stable = self._prob_debt_stable_sorted(self._sorted_sim_column('d', -5), self._sorted_sim_column('d', -1))
         return self.prob_stable
+
+    def _prob_debt_stable_sorted(self, d_penultimate_sorted, d_last_sorted):
+        """
+        Calculate share of evenly spaced quantile points at which sorted debt in the fifth-to-last year is at least 
+        sorted debt in the last year. The number of points is set by debt_stable_quantiles.
+        """
+        num_quantiles = getattr(self, 'debt_stable_quantiles', 10000)
+        idx = ((np.arange(num_quantiles) / num_quantiles) * (d_penultimate_sorted.shape[0] - 1)).astype(np.int64)
+        return np.mean(d_penultimate_sorted[idx] >= d_last_sorted[idx])
+
+    def _sorted_sim_column(self, var, column):
+        """
+        Return sorted column of a simulated variable, memoized until paths are simulated again, so the debt stable 
+        criterion and fanchart percentiles share one sort per column.
+        """
+        sim_var = getattr(self, f'{var}_sim')
+        column = column % sim_var.shape[1]
+        if not hasattr(self, '_sorted_sim_cache'):
+            self._sorted_sim_cache = {}
+        if (var, column) not in self._sorted_sim_cache:
+            self._sorted_sim_cache[(var, column)] = np.sort(sim_var[:, column])
+        return self._sorted_sim_cache[(var, column)]
+
+    @staticmethod
+    def _sorted_percentiles(sorted_values, pcts):
+        """
+        Return percentiles of sorted values with linear interpolation as in np.percentile, NaN if any value is NaN.
+        """
+        n = sorted_values.shape[0]
+        position = np.asarray(pcts) / 100 * (n - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, n - 1)
+        weight = position - lower
+        diff = sorted_values[upper] - sorted_values[lower]
+        percentiles = np.where(weight >= 0.5, sorted_values[upper] - diff * (1 - weight), sorted_values[lower] + diff * weight)
+        return np.where(np.isnan(sorted_values[-1]), np.nan, percentiles)
     
     def prob_debt_below_60(self):
         """
@@ -740,9 +1830,12 @@ class StochasticDsaModel(DsaModel):
                          stochastic=True,
                          print_results=True,
                          stochastic_criteria=['debt_declines', 'debt_below_60'],
-                         save_df=False):
+                         save_df=False,
+                         prune_criteria=False):
         """
         Find the structural primary balance that meets all criteria after deficit has been brought below 3% and debt safeguard is satisfied.
+        If prune_criteria is True, criteria that are already met at the highest SPB target found so far are not optimized and 
+        are listed in pruned_criteria instead of spb_target_dict. The binding target is unchanged, as criteria are monotone in the SPB target.
         """     
 
         # Set parameters
@@ -758,7 +1851,7 @@ class StochasticDsaModel(DsaModel):
 
         # Run DSA and deficit criteria and project toughest under baseline assumptions
         self.project(spb_target=None, edp_steps=None) # clear projection
-        self._run_dsa(stochastic=stochastic)
+        self._run_dsa(stochastic=stochastic, prune_criteria=prune_criteria)
         self._get_binding()
 
         # Apply EDP
@@ -804,8 +1897,9 @@ class StochasticDsaModel(DsaModel):
         # Save dataframe
         if self.save_df: 
             self.df_dict['binding'] = self.df(all=True)
+        self._retain_summary()
 
-    def _run_dsa(self, stochastic=True, criterion='all'):
+    def _run_dsa(self, stochastic=True, criterion='all', prune_criteria=False):
         """
         Run DSA for given criterion.
         """
@@ -814,26 +1908,42 @@ class StochasticDsaModel(DsaModel):
 
         # If all criteria, run all deterministic and stochastic
         if criterion == 'all':
+            self.pruned_criteria = []
             
             # Run all deterministic scenarios, skip if criterion not applicable
             for deterministic_criterion in deterministic_criteria_list:
+
+                # Skip search if criterion is already met at current binding SPB target
+                if (prune_criteria 
+                    and self.spb_target_dict
+                    and self._deterministic_condition_at(deterministic_criterion, max(self.spb_target_dict.values()))):
+                    self.pruned_criteria.append(deterministic_criterion)
+                    continue
+
                 try:
                     self.find_spb_deterministic(criterion=deterministic_criterion)
                     self.spb_target_dict[deterministic_criterion] = self.spb_bca[self.adjustment_end]
                     self.pb_target_dict[deterministic_criterion] = self.pb[self.adjustment_end]
                     if self.save_df:
                         self.df_dict[deterministic_criterion] = self.df(all=True)
+                except NoSolution:
+                    raise
                 except:
                     raise ValueError(f'{deterministic_criterion} did not converge for {self.country}')
 
             # Run stochastic scenario, skip if not possible due to lack of data
             if stochastic == True:
                 try: 
-                    self.find_spb_stochastic()
-                    self.spb_target_dict['stochastic'] = self.spb_bca[self.adjustment_end]
-                    self.pb_target_dict['stochastic'] = self.pb[self.adjustment_end]
-                    if self.save_df: 
-                        self.df_dict['stochastic'] = self.df(all=True)
+                    # Check criterion at current binding SPB target, shocks drawn for the check are reused by the optimizer
+                    check_stochastic = prune_criteria and bool(self.spb_target_dict)
+                    if check_stochastic and self._stochastic_condition_at(max(self.spb_target_dict.values())):
+                        self.pruned_criteria.append('stochastic')
+                    else:
+                        self.find_spb_stochastic(redraw_shocks=not check_stochastic)
+                        self.spb_target_dict['stochastic'] = self.spb_bca[self.adjustment_end]
+                        self.pb_target_dict['stochastic'] = self.pb[self.adjustment_end]
+                        if self.save_df: 
+                            self.df_dict['stochastic'] = self.df(all=True)
                 except:
                     pass
 
@@ -1056,6 +2166,31 @@ class StochasticDsaModel(DsaModel):
     def find_deficit_prob(self):
         """
         Find the probability of the deficit exceeding 3% in each adjustment period for binding SPB path.
+        The projection, stochastic configuration and simulated paths of the model are restored afterwards, 
+        so the same instance can be used for further stochastic analysis.
+        """
+        # Keep projection and simulation state, simulated arrays are replaced rather than modified
+        projection_variables = self._projection_outputs + self._projection_inputs
+        projection_state = self._projection_state(projection_variables)
+        simulation_state = {var: getattr(self, var) for var in self._deficit_simulation_attributes if hasattr(self, var)}
+        try:
+            self.prob_deficit = self._simulate_deficit_prob()
+        finally:
+            self._set_projection_state(projection_state)
+            for var in projection_variables:
+                if var not in projection_state and hasattr(self, var):
+                    delattr(self, var)
+            for var in self._deficit_simulation_attributes:
+                if var in simulation_state:
+                    setattr(self, var, simulation_state[var])
+                elif hasattr(self, var):
+                    delattr(self, var)
+
+        return self.prob_deficit
+
+    def _simulate_deficit_prob(self):
+        """
+        Simulate deficits on the binding SPB path over the adjustment period and return excessive deficit probabilities.
         """
         # Initial projection
         self.project(
@@ -1075,11 +2210,15 @@ class StochasticDsaModel(DsaModel):
         else:
             self.draw_period = self.stochastic_period
 
-        # Set exchange rate and primary balance shock to zero
-        self.df_shocks[['EXR_EUR', 'EXR_USD', 'PRIMARY_BALANCE']] = 0
+        # Set exchange rate and primary balance shock covariances to zero, shock data is not modified
+        cov_matrix = self._shock_cov_matrix().copy()
+        cov_matrix[['EXR_EUR', 'EXR_USD', 'PRIMARY_BALANCE']] = 0
+        cov_matrix.loc[['EXR_EUR', 'EXR_USD', 'PRIMARY_BALANCE']] = 0
 
-        # Draw quarterly shocks
-        self._draw_shocks_normal()
+        # Draw quarterly shocks from a fixed child stream, the model seed is not advanced
+        if not hasattr(self, '_seed_sequence'):
+            self._seed_sequence = self._make_seed_sequence(getattr(self, 'seed', None))
+        self._draw_shocks_normal(self._child_seed(self._seed_sequence, self.deficit_stream_key), cov_matrix=cov_matrix)
 
         # Aggregate quarterly shocks to annual shocks
         if self.shock_frequency == 'quarterly': 
@@ -1097,14 +2236,12 @@ class StochasticDsaModel(DsaModel):
         self._simulate_debt()
         
         # Simulate deficit
-        self.ob_sim = np.zeros([self.N, self.stochastic_period+1])
+        self.ob_sim = np.zeros([self.N, self.stochastic_period+1], dtype=self.dtype)
         self.ob_sim[:, 0] = self.ob[self.stochastic_start-1]
         self._simulate_deficit()
 
         # Calculate probability of excessive deficit
-        self.prob_deficit = self._prob_deficit()
-        
-        return self.prob_deficit
+        return self._prob_deficit()
 
     def _simulate_deficit(self):
         """
@@ -1118,13 +2255,19 @@ class StochasticDsaModel(DsaModel):
     def _prob_deficit(self):
         """
         Calculate the probability of the deficit exceeding 3% in two consecutive period or 3.5% in one period during adjustment.
+        Per-year probabilities of each breach are stored as series prob_deficit_3 (two-year) and prob_deficit_3_5 (one-year).
         """
-        prob_excessive_deficit = np.full(self.adjustment_period, 0, dtype=np.float64)
-        for n in range(self.N):
-            for i in range(self.adjustment_period):
-                if -3.5 > self.ob_sim[n, i+1] or (-3 > self.ob_sim[n, i+1] and -3 > self.ob_sim[n, i+2]):
-                    prob_excessive_deficit[i] += 1
-        return prob_excessive_deficit / self.N  
+        # Boolean breaches of each path and adjustment year
+        ob_sim = self.ob_sim[:, 1:self.adjustment_period+2]
+        breach_3_5 = ob_sim[:, :-1] < -3.5
+        breach_3 = (ob_sim[:, :-1] < -3) & (ob_sim[:, 1:] < -3)
+
+        # Store breach probabilities by adjustment year
+        years = np.arange(self.adjustment_start_year, self.adjustment_start_year + self.adjustment_period)
+        self.prob_deficit_3 = pd.Series(breach_3.mean(axis=0), index=years, name='prob_deficit_3')
+        self.prob_deficit_3_5 = pd.Series(breach_3_5.mean(axis=0), index=years, name='prob_deficit_3_5')
+
+        return (breach_3_5 | breach_3).mean(axis=0)
     
     def var_forecast_pb(self, forecast_start_year=None):
         """
@@ -1161,15 +2304,16 @@ class StochasticDsaModel(DsaModel):
         # elif self.country == 'USA':
         #     var_sample = var_sample.drop(columns=['EXR_USD'])
 
-        # Fit VAR model \.fit(ic='bic')
-        self.var = VAR(var_sample).fit(ic='bic')
+        # Fit VAR model with lag order selected by BIC or get cached parameters
+        self.var_params = self._fit_var(var_sample, lags='bic')
 
         # Set shock frequency back to original
         self.shock_frequency = original_shock_frequency
 
         # Extract lags and coefficients from the VAR model.
-        lags = self.var.k_ar
-        pb_coefs = self.var.params['PRIMARY_BALANCE'].values  # shape: (1 + p * len(var_names),)
+        lags = self.var_params['lags']
+        var_names = self.var_params['columns']
+        pb_coefs = self.var_params['params'][:, var_names.index('PRIMARY_BALANCE')]  # shape: (1 + p * len(var_names),)
 
         # Initialize forecasted primary balance and steps steps.
         self.forecast_pb = np.copy(self.pb)
@@ -1184,7 +2328,7 @@ class StochasticDsaModel(DsaModel):
             X = [1]
             # For each lag, append the value of each variable at time t-lag.
             for l in range(1, lags + 1):
-                for var in self.var.params.columns:
+                for var in var_names:
 
                     # For pb, use the actual value before the forecast period.
                     if var == 'PRIMARY_BALANCE':
@@ -1217,52 +2361,138 @@ class StochasticDsaModel(DsaModel):
 #                                NUMBA OPTIMIZED FUNCTIONS                                  #
 # ========================================================================================= #
 
-@jit(nopython=True)
-def vecmatmul(vec, mat):
-    """
-    Multiply a 1d vector with a 2d matrix.
-    """
-    rows, cols = mat.shape
-    result = np.zeros(rows)
-    for i in range(rows):
-        for j in range(cols):
-            result[i] += mat[i, j] * vec[j]
-    return result
-
-@jit(nopython=True)
-def construct_var_shocks(N, draw_period, shocks_sim_draws, lags, intercept, coefs, residual_draws, stochastic_within_adjustment):
+# Parallel kernels loop over independent paths with prange, probability counts are integer 
+# reductions, so results do not depend on the number of threads.
+
+@jit(nopython=True, parallel=True, cache=True)
+def construct_var_shocks(N, draw_period, shocks_sim_draws, lags, intercept, coefs, residual_draws, stochastic_within_adjustment, columns):
     """
-    Simulate the shocks for the baseline variables.
+    Simulate the shocks for the baseline variables. Each shock is accumulated in place from its lagged values and 
+    written to its column of shocks_sim_draws. PB coefficients and intercept are zero during the adjustment period.
     """
-    # set all coefs for pb, which is pos -1 to zero
-    coef_pb_zero = coefs.copy()
-    coef_pb_zero[:,-1,:] = 0
-    coef_pb_zero[:,:,-1] = 0
-    intercept_pb_zero = intercept.copy()
-    intercept_pb_zero[-1] = 0
-
-    for n in range(N):
+    num_variables = intercept.shape[0]
+
+    # Set all coefs for pb, which is pos -1, to zero once for all paths
+    coefs_adjustment = coefs.copy()
+    coefs_adjustment[:, -1, :] = 0
+    coefs_adjustment[:, :, -1] = 0
+    intercept_adjustment = intercept.copy()
+    intercept_adjustment[-1] = 0
+
+    for n in prange(N):
         for t in range(draw_period):
             if t < stochastic_within_adjustment:
-                use_coefs = coef_pb_zero
-                use_intercept = intercept_pb_zero
+                use_coefs = coefs_adjustment
+                use_intercept = intercept_adjustment
             else:
                 use_coefs = coefs
                 use_intercept = intercept
-            shock = use_intercept.copy()
-            for lag in range(1, lags + 1):
-                if t - lag >= 0:
-                    shock += vecmatmul(shocks_sim_draws[n, t - lag, :], use_coefs[lag - 1])
-            shocks_sim_draws[n, t, :] = shock + residual_draws[n, t, :]
+            for i in range(num_variables):
+                shock = use_intercept[i]
+                for lag in range(1, min(lags, t) + 1):
+                    lagged_shock = 0.0
+                    for j in range(num_variables):
+                        lagged_shock += use_coefs[lag - 1, i, j] * shocks_sim_draws[n, t - lag, columns[j]]
+                    shock += lagged_shock
+                shocks_sim_draws[n, t, columns[i]] = shock + residual_draws[n, t, i]
     return shocks_sim_draws
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
+def splitmix64_jit(state):
+    """
+    Advance SplitMix64 state, return new state and 64 random bits.
+    """
+    state = state + np.uint64(0x9E3779B97F4A7C15)
+    z = state
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return state, z ^ (z >> np.uint64(31))
+
+@jit(nopython=True, cache=True)
+def uniform_jit(state):
+    """
+    Advance SplitMix64 state, return new state and uniform number in (0, 1) from the upper 53 bits.
+    """
+    state, bits = splitmix64_jit(state)
+    return state, (np.float64(bits >> np.uint64(11)) + 0.5) / 9007199254740992.0
+
+@jit(nopython=True, parallel=True, cache=True)
+def draw_aggregate_shocks_jit(N, num_draws, key, factor, periods_per_year, stochastic_within_adjustment, start_periods, weights, D_share_st, D_share_lt, shocks_sim, block_size=1024):
+    """
+    Draw correlated normal shocks per path and aggregate them to annual shocks written to shocks_sim.
+    Path n draws from a SplitMix64 stream seeded by key and n, paths n >= num_draws mirror path n - num_draws.
+    Normals are drawn in pairs by the polar method, PB shocks are zero in the first stochastic_within_adjustment periods.
+    Long-term interest rate shocks of year t sum draws from start_periods[t] to the end of year t.
+    """
+    num_variables = factor.shape[0]
+    stochastic_period = shocks_sim.shape[2]
+    draw_period = stochastic_period * periods_per_year
+    num_blocks = (N + block_size - 1) // block_size
+    for b in prange(num_blocks):
+
+        # Buffers are allocated once per block of paths
+        z = np.empty(num_variables + 1)
+        shock = np.empty(num_variables)
+        annual_shocks = np.empty(num_variables)
+        lt_shocks = np.empty(stochastic_period)
+        for n in range(b * block_size, min((b + 1) * block_size, N)):
+
+            # Seed stream of path from its hashed index, mirrored paths reuse the stream with opposite sign
+            path = n if n < num_draws else n - num_draws
+            sign = 1.0 if n < num_draws else -1.0
+            _, path_bits = splitmix64_jit(np.uint64(path))
+            state, _ = splitmix64_jit(key ^ path_bits)
+
+            annual_shocks[:] = 0.0
+            lt_shocks[:] = 0.0
+            for q in range(draw_period):
+
+                # Draw standard normals in pairs, rejecting points outside the unit circle
+                for i in range(0, num_variables, 2):
+                    s = 0.0
+                    while s >= 1.0 or s == 0.0:
+                        state, u1 = uniform_jit(state)
+                        state, u2 = uniform_jit(state)
+                        u1 = 2.0 * u1 - 1.0
+                        u2 = 2.0 * u2 - 1.0
+                        s = u1 * u1 + u2 * u2
+                    r = sign * np.sqrt(-2.0 * np.log(s) / s)
+                    z[i] = r * u1
+                    z[i + 1] = r * u2
+
+                # Correlate draws, PB shocks are zero during adjustment period
+                for i in range(num_variables):
+                    shock[i] = 0.0
+                    for j in range(num_variables):
+                        shock[i] += factor[i, j] * z[j]
+                if q < stochastic_within_adjustment:
+                    shock[-1] = 0.0
+
+                # Sum shocks of the year and long-term interest rate shocks of all years whose maturity window covers q
+                for i in range(num_variables):
+                    annual_shocks[i] += shock[i]
+                for t in range(q // periods_per_year, stochastic_period):
+                    if start_periods[t] > q:
+                        break
+                    lt_shocks[t] += shock[3]
+
+                # Write annual shocks at the end of each year
+                if (q + 1) % periods_per_year == 0:
+                    t = q // periods_per_year
+                    shocks_sim[n, 0, t] = annual_shocks[0]
+                    shocks_sim[n, 1, t] = annual_shocks[1]
+                    shocks_sim[n, 2, t] = D_share_st * annual_shocks[2] + D_share_lt * weights[t] * lt_shocks[t]
+                    shocks_sim[n, 3, t] = annual_shocks[4]
+                    shocks_sim[n, 4, t] = annual_shocks[5]
+                    annual_shocks[:] = 0.0
+
+@jit(nopython=True, parallel=True, cache=True)
 def combine_shocks_baseline_jit(N, stochastic_start, stochastic_end, shocks_sim, exr_eur, exr_usd, iir, ng, pb, sf, d, d_sim, exr_eur_sim, exr_usd_sim, iir_sim, ng_sim, pb_sim, sf_sim):
     """
     Add shocks to the baseline variables and set starting values for simulation.
     """
     # Add shocks to the baseline variables for stochastic period
-    for n in range(N):
+    for n in prange(N):
         exr_eur_sim[n, 1:] = exr_eur[stochastic_start:stochastic_end+1] + shocks_sim[n, 0] 
         exr_usd_sim[n, 1:] = exr_usd[stochastic_start:stochastic_end+1] + shocks_sim[n, 1]
         iir_sim[n, 1:] = iir[stochastic_start:stochastic_end+1] + shocks_sim[n, 2]
@@ -1280,22 +2510,68 @@ def combine_shocks_baseline_jit(N, stochastic_start, stochastic_end, shocks_sim,
     ng_sim[:, 0] = ng[stochastic_start-1]
     pb_sim[:, 0] = pb[stochastic_start-1]
 
-@jit(nopython=True)
+@jit(nopython=True, parallel=True, cache=True)
 def simulate_debt_jit(N, stochastic_period, D_share_domestic, D_share_eur, D_share_usd, d_sim, iir_sim, ng_sim, exr_eur_sim, exr_usd_sim, pb_sim, sf_sim):
     """
     Simulate the debt-to-GDP ratio using the baseline variables and the shocks.
     """
-    for n in range(N):
+    for n in prange(N):
         for t in range(1, stochastic_period+1):
             d_sim[n, t] = D_share_domestic * d_sim[n, t-1] * (1 + iir_sim[n, t]/100) / (1 + ng_sim[n, t]/100) \
                         + D_share_eur * d_sim[n, t-1] * (1 + iir_sim[n, t]/100) / (1 + ng_sim[n, t]/100) * (exr_eur_sim[n, t]) / (exr_eur_sim[n, t-1]) \
                         + D_share_usd * d_sim[n, t-1] * (1 + iir_sim[n, t]/100) / (1 + ng_sim[n, t]/100) * (exr_usd_sim[n, t]) / (exr_usd_sim[n, t-1]) \
                         - pb_sim[n, t] + sf_sim[n, t]
 
-@jit(nopython=True)
+@jit(nopython=True, parallel=True, cache=True)
+def simulate_debt_criteria_jit(N, stochastic_start, stochastic_period, D_share_domestic, D_share_eur, D_share_usd, shocks_sim, exr_eur, exr_usd, iir, ng, pb, sf, d, columns, d_columns):
+    """
+    Simulate the debt-to-GDP ratio path by path without storing the paths. Writes the floored debt ratio at the 
+    given columns to d_columns and returns the number of paths with debt below 60 at the end.
+    """
+    count_below_60 = 0
+    for n in prange(N):
+        # Set the starting values to the last value before the stochastic period
+        d_prev = d[stochastic_start-1]
+        exr_eur_prev = exr_eur[stochastic_start-1]
+        exr_usd_prev = exr_usd[stochastic_start-1]
+        d_floor = d_prev if not d_prev < 0 else 0.0
+        for j in range(columns.shape[0]):
+            if columns[j] == 0:
+                d_columns[n, j] = d_floor
+
+        for t in range(1, stochastic_period+1):
+            # Add shocks to the baseline variables
+            exr_eur_t = exr_eur[stochastic_start+t-1] + shocks_sim[n, 0, t-1]
+            exr_usd_t = exr_usd[stochastic_start+t-1] + shocks_sim[n, 1, t-1]
+            iir_t = iir[stochastic_start+t-1] + shocks_sim[n, 2, t-1]
+            ng_t = ng[stochastic_start+t-1] + shocks_sim[n, 3, t-1]
+            pb_t = pb[stochastic_start+t-1] + shocks_sim[n, 4, t-1]
+            sf_t = sf[stochastic_start+t-1]
+
+            # Debt recursion on unfloored values, as in simulate_debt_jit
+            d_t = D_share_domestic * d_prev * (1 + iir_t/100) / (1 + ng_t/100) \
+                + D_share_eur * d_prev * (1 + iir_t/100) / (1 + ng_t/100) * (exr_eur_t) / (exr_eur_prev) \
+                + D_share_usd * d_prev * (1 + iir_t/100) / (1 + ng_t/100) * (exr_usd_t) / (exr_usd_prev) \
+                - pb_t + sf_t
+
+            # Set negative debt-to-GDP ratios to zero in output only
+            d_floor = d_t if not d_t < 0 else 0.0
+            for j in range(columns.shape[0]):
+                if columns[j] == t:
+                    d_columns[n, j] = d_floor
+
+            d_prev = d_t
+            exr_eur_prev = exr_eur_t
+            exr_usd_prev = exr_usd_t
+
+        if d_floor <= 60:
+            count_below_60 += 1
+    return count_below_60
+
+@jit(nopython=True, cache=True)
 def mean_jit(arr):
     """
-    Calculate the mean of an array.
+    Calculate the mean of an array. Kept serial so that the summation order does not depend on the number of threads.
     """
     total = 0.0
     count = 0
@@ -1304,49 +2580,41 @@ def mean_jit(arr):
         count += 1
     return total / count
         
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def prob_debt_declines_jit(N, d_sim, stochastic_criterion_start):
     """
     Calculate the probability of the debt-to-GDP ratio exploding.
     """
+    return prob_debt_declines_columns_jit(N, d_sim[:, stochastic_criterion_start], d_sim[:, -1])
+
+@jit(nopython=True, parallel=True, cache=True)
+def prob_debt_declines_columns_jit(N, d_start, d_end):
+    """
+    Calculate the probability of the debt-to-GDP ratio exploding from debt at criterion start and end of each path.
+    """
     prob_declines = 0
-    d_start = mean_jit(d_sim[:, stochastic_criterion_start])
-    for n in range(N):
-        if d_start >= d_sim[n, -1]:
+    d_start_mean = mean_jit(d_start)
+    for n in prange(N):
+        if d_start_mean >= d_end[n]:
             prob_declines += 1
     return prob_declines / N
 
-@jit(nopython=True)
-def prob_debt_stable_jit(N, d_sim):
-    """
-    Calculate the probability of the debt-to-GDP ratio stabalizing by projection end.
-    """
-    d_penultimate_sorted = np.sort(d_sim[:, -5])
-    d_last_sorted = np.sort(d_sim[:, -1])    
-    n = d_sim.shape[0]
-    prob_debt_stable = 0
-    for i in range(10000):
-        idx = int((i / 10000) * (n - 1))
-        if d_penultimate_sorted[idx] >= d_last_sorted[idx]:
-            prob_debt_stable += 1
-    return prob_debt_stable / 10000
-
-@jit(nopython=True)
+@jit(nopython=True, parallel=True, cache=True)
 def prob_debt_below_60_jit(N, d_sim):
     """
     Calculate the probability of the debt-to-GDP ratio exceeding 60
     """
     prob_debt_below_60 = 0
-    for n in range(N):
+    for n in prange(N):
         if d_sim[n, -1] <= 60:
             prob_debt_below_60 += 1
     return prob_debt_below_60 / N
 
-@jit(nopython=True)
+@jit(nopython=True, parallel=True, cache=True)
 def simulate_deficit_jit(N, stochastic_period, pb_sim, iir_sim, ng_sim, d_sim, ob_sim):
     """
     Simulate the fiscal balance ratio using the baseline variables and the shocks.
     """
-    for n in range(N):
+    for n in prange(N):
         for t in range(1, stochastic_period+1):
             ob_sim[n, t] = pb_sim[n, t] - iir_sim[n, t] / 100 / (1 + ng_sim[n, t] / 100) * d_sim[n, t-1]
\ No newline at end of file
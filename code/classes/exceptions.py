@@ -3,3 +3,20 @@ class MissingData(Exception):
 
     def __init__(self, what, year, index):
         super().__init__(f"Missing data: {what} for year {year} (index {index})")
+
+
+class NoSolution(ValueError):
+    """Raised when no SPB target within bounds satisfies a criterion"""
+
+    def __init__(self, criterion, country, bounds, bound_values):
+        self.criterion = criterion
+        self.country = country
+        self.bounds = bounds
+        self.bound_values = bound_values
+        super().__init__(
+            f"No solution for {criterion} in {country} within bounds {bounds}, criterion values at bounds: {bound_values}"
+        )
+
+    def __reduce__(self):
+        # Keep structured attributes when pickled across processes
+        return (self.__class__, (self.criterion, self.country, self.bounds, self.bound_values))
@@ -0,0 +1,117 @@
+# Import libraries and modules
+import time
+import numpy as np
+import pandas as pd
+
+# Import DSA model class and stochastic subclass
+from classes import StochasticDsaModel as DSA
+
+def benchmark_dtype(
+        countries,
+        N=100000,
+        adjustment_period=4,
+        spb_target=None,
+        seed=0,
+        ):
+    """
+    Compare stochastic criteria probabilities simulated in float32 and float64 with the same shocks.
+    Reports the absolute probability difference relative to the Monte Carlo standard error, runtime and shock memory.
+    """
+    results = []
+    for country in countries:
+        row = {'country': country}
+        for dtype in ['float64', 'float32']:
+
+            # Create model and project with SPB target, default is no-policy-change
+            model = DSA(country=country, adjustment_period=adjustment_period, dtype=dtype, seed=seed)
+            model.stochastic_criteria = ['debt_declines', 'debt_stable', 'debt_below_60']
+            model._set_stochastic_parameters()
+            model.project(spb_target=spb_target)
+
+            # Simulate with same seed and calculate probabilities
+            start = time.time()
+            model.simulate(N=N)
+            model._simulate_debt_criteria()
+            row[f'time_{dtype}'] = time.time() - start
+            row[f'shock_mb_{dtype}'] = (model.shocks_sim_draws.nbytes + model.shocks_sim.nbytes) / 1e6
+            for prob in ['prob_declines', 'prob_stable', 'prob_below_60']:
+                row[f'{prob}_{dtype}'] = getattr(model, prob)
+
+        # Compare probabilities to Monte Carlo standard error
+        for prob in ['prob_declines', 'prob_stable', 'prob_below_60']:
+            p = row[f'{prob}_float64']
+            row[f'{prob}_diff'] = np.abs(row[f'{prob}_float32'] - p)
+            row[f'{prob}_se'] = np.sqrt(p * (1 - p) / N)
+        results.append(row)
+
+    return pd.DataFrame(results).set_index('country')
+
+def benchmark_sobol(
+        countries=None,
+        N_list=[2**10, 2**12, 2**14, 2**16],
+        replications=10,
+        N_reference=2**20,
+        adjustment_period=4,
+        binding_parameters=None,
+        seed=0,
+        ):
+    """
+    Compare convergence of pseudo-random and scrambled Sobol shock draws for the stochastic criteria on the binding 
+    adjustment paths. Binding parameters can be given by country as the binding_parameter_dict of find_spb_binding. 
+    For each sample size, the estimator is replicated with independent seeds or scramblings. Reports the standard 
+    deviation across replications and the RMSE against a large pseudo-random reference simulation.
+    """
+    if countries is None:
+        countries = ['AUT', 'BEL', 'BGR', 'HRV', 'CYP', 'CZE', 'DNK', 'EST', 'FIN', 
+                     'FRA', 'DEU', 'GRC', 'HUN', 'IRL', 'ITA', 'LVA', 'LTU', 'LUX', 
+                     'MLT', 'NLD', 'POL', 'PRT', 'ROU', 'SVK', 'SVN', 'ESP', 'SWE']
+    probs = ['prob_declines', 'prob_below_60']
+    results = []
+    for country in countries:
+
+        # Get binding adjustment path from deterministic criteria if not given
+        if binding_parameters is not None and country in binding_parameters:
+            country_parameters = binding_parameters[country]
+        else:
+            model = DSA(country=country, adjustment_period=adjustment_period)
+            model.find_spb_binding(stochastic=False, print_results=False)
+            country_parameters = model.binding_parameter_dict
+        spb_target = country_parameters['spb_target']
+
+        # Reference probabilities from large pseudo-random simulation
+        reference = _simulate_probs(
+            country, adjustment_period, country_parameters, N_reference, 'pseudo', seed, chunk_size=2**17
+            )
+
+        # Replicate estimates for each sampler and sample size
+        for rng in ['pseudo', 'sobol']:
+            for N in N_list:
+                estimates = []
+                start = time.time()
+                for r in range(replications):
+                    estimates.append(_simulate_probs(country, adjustment_period, country_parameters, N, rng, seed + 1 + r))
+                estimates = np.array(estimates)
+                row = {'country': country, 'rng': rng, 'N': N, 'spb_target': spb_target,
+                       'time': (time.time() - start) / replications}
+                for i, prob in enumerate(probs):
+                    row[f'{prob}_mean'] = estimates[:, i].mean()
+                    row[f'{prob}_std'] = estimates[:, i].std(ddof=1)
+                    row[f'{prob}_rmse'] = np.sqrt(np.mean((estimates[:, i] - reference[i])**2))
+                results.append(row)
+
+    return pd.DataFrame(results).set_index(['country', 'rng', 'N'])
+
+def _simulate_probs(country, adjustment_period, binding_parameters, N, rng, seed, chunk_size=None):
+    """
+    Simulate debt declines and debt below 60 probabilities on the adjustment path of the binding parameters.
+    """
+    model = DSA(country=country, adjustment_period=adjustment_period, N=N, rng=rng, seed=seed, chunk_size=chunk_size)
+    model._set_stochastic_parameters()
+    model.project(
+        spb_target=binding_parameters['spb_target'],
+        edp_steps=binding_parameters.get('edp_steps'),
+        deficit_resilience_steps=binding_parameters.get('deficit_resilience_steps'),
+        )
+    model.simulate()
+    model._simulate_debt_criteria()
+    return model.prob_declines, model.prob_below_60